@@ -1,48 +1,107 @@
-(defun c:CheckPolygonOrientation ( / ent obj coords n area i x1 y1 x2 y2)
+; Удвоенная знаковая площадь по формуле Гаусса для плоского списка
+; координат (x1 y1 x2 y2 ...): больше нуля - обход против часовой стрелки.
+; Список проходится один раз, без обращения к вершинам по номеру.
+(defun PolygonSignedArea2 (coords / x0 y0 x1 y1 x2 y2 area)
+    (setq x0 (car coords)
+          y0 (cadr coords)
+          area 0.0)
+    ; Координаты относительно первой вершины: меньше потеря точности
+    (setq x1 0.0 y1 0.0 coords (cddr coords))
+    (while coords
+        (setq x2 (- (car coords) x0)
+              y2 (- (cadr coords) y0))
+        (setq area (+ area (- (* x1 y2) (* x2 y1))))
+        (setq x1 x2 y1 y2 coords (cddr coords))
+    )
+    ; Замыкающее ребро к первой вершине (0 0) вклада не дает
+    area
+)
+
+; Ориентация замкнутой полилинии: 1 - CCW, -1 - CW, 0 - вырожденная
+(defun PolylineOrientation (obj / area)
+    (setq area (PolygonSignedArea2 (vlax-get obj 'coordinates)))
+    (cond ((> area 0.0) 1) ((< area 0.0) -1) (t 0))
+)
+
+; Есть ли у полилинии дуговые сегменты (ненулевая выпуклость)
+(defun PolylineHasBulges (ent)
+    (vl-some '(lambda (pair) (and (= (car pair) 42) (/= (cdr pair) 0.0))) (entget ent))
+)
+
+; Замкнутые LWPOLYLINE из выбора пользователя или nil
+(defun SelectClosedPolylines ()
+    (ssget '((0 . "LWPOLYLINE") (-4 . "&") (70 . 1)))
+)
+
+(defun c:CheckPolygonOrientation ( / ss i obj orientation ccw cw degenerate)
     (vl-load-com) ; Загрузка расширений ActiveX
-    
-    (setq ent (car (entsel "\nВыберите замкнутую полилинию: ")))
-    (if ent
+
+    (prompt "\nВыберите замкнутые полилинии: ")
+    (setq ss (SelectClosedPolylines))
+    (if ss
         (progn
-            (setq obj (vlax-ename->vla-object ent))
-            (if (and
-                    (eq (vla-get-objectname obj) "AcDbPolyline") ; Проверка типа объекта
-                    (eq (vla-get-closed obj) :vlax-true)         ; Проверка замкнутости
-                (progn
-                    (setq coords (vlax-get obj 'coordinates))    ; Получение координат
-                    (setq n (/ (length coords) 2))               ; Количество точек
-                    (setq area 0.0)
-                    
-                    ; Вычисление площади по формуле Гаусса
-                    (setq i 0)
-                    (repeat n
-                        ; Текущая вершина
-                        (setq x1 (nth (* i 2) coords))
-                        (setq y1 (nth (1+ (* i 2)) coords))
-                        
-                        ; Следующая вершина (с замыканием на первую)
-                        (if (= i (1- n))
-                            (setq j 0)
-                            (setq j (1+ i))
+            (setq ccw 0 cw 0 degenerate 0 i 0)
+            (repeat (sslength ss)
+                (setq obj (vlax-ename->vla-object (ssname ss i)))
+                (setq orientation (PolylineOrientation obj))
+                (cond ((= orientation 1) (setq ccw (1+ ccw)))
+                      ((= orientation -1) (setq cw (1+ cw)))
+                      (t (setq degenerate (1+ degenerate))))
+                (setq i (1+ i))
+            )
+            (if (= (sslength ss) 1)
+                ; Один объект: сообщение, как и раньше
+                (cond ((= ccw 1) (alert "Ориентация: против часовой стрелки (CCW)"))
+                      ((= cw 1) (alert "Ориентация: по часовой стрелке (CW)"))
+                      (t (alert "Полилиния вырождена (нулевая площадь)")))
+                (alert (strcat "Полилиний: " (itoa (sslength ss))
+                               "\nПротив часовой стрелки (CCW): " (itoa ccw)
+                               "\nПо часовой стрелке (CW): " (itoa cw)
+                               "\nВырожденных: " (itoa degenerate)))
+            )
+        )
+        (alert "Замкнутые полилинии не выбраны!")
+    )
+    (princ)
+)
+
+; Разворачивает полилинии, обходимые по часовой стрелке, против нее.
+; Полилинии с дуговыми сегментами пропускаются: при развороте пришлось бы
+; переставлять и менять знак выпуклостей.
+(defun c:FixPolygonOrientation ( / ss i ent obj coords points fixed skipped)
+    (vl-load-com)
+
+    (prompt "\nВыберите замкнутые полилинии: ")
+    (setq ss (SelectClosedPolylines))
+    (if ss
+        (progn
+            (setq fixed 0 skipped 0 i 0)
+            (repeat (sslength ss)
+                (setq ent (ssname ss i))
+                (setq obj (vlax-ename->vla-object ent))
+                (if (= (PolylineOrientation obj) -1)
+                    (if (PolylineHasBulges ent)
+                        (setq skipped (1+ skipped))
+                        (progn
+                            ; Пары (x y) в обратном порядке
+                            (setq coords (vlax-get obj 'coordinates) points nil)
+                            (while coords
+                                (setq points (cons (list (car coords) (cadr coords)) points)
+                                      coords (cddr coords))
+                            )
+                            (vlax-put obj 'coordinates (apply 'append points))
+                            (setq fixed (1+ fixed))
                         )
-                        (setq x2 (nth (* j 2) coords))
-                        (setq y2 (nth (1+ (* j 2)) coords))
-                        
-                        ; Суммирование
-                        (setq area (+ area (- (* x1 y2) (* x2 y1))))
-                        (setq i (1+ i))
-                    )
-                    
-                    ; Определение ориентации
-                    (if (> area 0.0)
-                        (alert "Ориентация: против часовой стрелки (CCW)")
-                        (alert "Ориентация: по часовой стрелке (CW)")
                     )
                 )
-                (alert "Объект не является замкнутой полилинией!")
+                (setq i (1+ i))
             )
+            (alert (strcat "Развернуто полилиний: " (itoa fixed)
+                           (if (> skipped 0)
+                               (strcat "\nПропущено (есть дуги): " (itoa skipped))
+                               "")))
         )
-        (alert "Объект не выбран!")
+        (alert "Замкнутые полилинии не выбраны!")
     )
     (princ)
 )
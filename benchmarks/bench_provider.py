@@ -0,0 +1,555 @@
+"""Замеры производительности провайдера MYVEC.
+
+Запуск без дисплея:
+    python benchmarks/bench_provider.py
+
+Сравнение загрузки с другой ревизией (например, из git worktree):
+    python benchmarks/bench_provider.py --provider-dir /tmp/baseline
+
+Набор замеров основных путей провайдера с результатом в JSON и сравнение
+двух прогонов (код возврата 1, если есть регрессии):
+    python benchmarks/bench_provider.py --suite --json new.json
+    python benchmarks/bench_provider.py --compare old.json new.json
+
+Генерация файла (поля, распределение точек и доля NULL настраиваются):
+    python benchmarks/bench_provider.py --generate data.myvec --sizes 1000000
+        --fields id:int,name:string,value:double,day:date --distribution clustered --null-ratio 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SIZES = [10_000, 100_000, 1_000_000]
+SUITE_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+QUERIES = 200
+# Запросов по прямоугольнику в процессе замера загрузки: у прежних ревизий
+# запрос стоит O(N), и 200 запросов на миллионе строк шли бы минуты
+CHILD_QUERIES = 20
+
+DEFAULT_FIELDS = 'id:int,name:string,value:double'
+DISTRIBUTIONS = ('uniform', 'clustered')
+# Число скоплений и их разброс для распределения clustered
+CLUSTERS = 20
+CLUSTER_SIGMA = 20.0
+# Строк, генерируемых за один раз
+GENERATE_CHUNK = 100_000
+# Замедление меньше этого (в секундах) не считается регрессией: шум таймера
+MIN_REGRESSION_S = 0.0005
+
+
+def _field_values(rng, name, type_name, start, count):
+    """Значения колонки в текстовом виде для строк start..start + count"""
+    type_name = type_name.lower()
+    if type_name in ('int', 'integer'):
+        # Поле id - порядковый номер строки
+        values = np.arange(start, start + count) if name == 'id' else rng.integers(0, 1000, count)
+        return values.astype(str)
+    if type_name in ('double', 'float'):
+        return np.char.mod('%.4f', rng.random(count))
+    if type_name == 'bool':
+        return np.where(rng.random(count) < 0.5, 'true', 'false')
+    if type_name == 'date':
+        days = rng.integers(0, 9000, count).astype('timedelta64[D]')
+        return np.datetime_as_string(np.datetime64('2000-01-01') + days, unit='D')
+    if type_name == 'datetime':
+        seconds = rng.integers(0, 9000 * 86400, count).astype('timedelta64[s]')
+        return np.datetime_as_string(np.datetime64('2000-01-01T00:00:00') + seconds, unit='s')
+    # Строки: 100 различных значений
+    return np.char.add('n', (np.arange(start, start + count) % 100).astype(str))
+
+
+def write_dataset(path, count, seed=42, fields=DEFAULT_FIELDS, distribution='uniform', null_ratio=0.0):
+    """Генерирует файл .myvec.
+
+    fields - описание полей в формате HEADER, distribution - uniform
+    (равномерно в квадрате 1000x1000) или clustered (скопления точек),
+    null_ratio - доля пустых значений во всех полях, кроме id.
+    """
+    rng = np.random.default_rng(seed)
+    specs = [field.split(':', 1) for field in fields.split(',')]
+    centers = rng.uniform(100, 900, (CLUSTERS, 2))
+    with open(path, 'w') as f:
+        f.write(f'HEADER:{fields}\n')
+        for start in range(0, count, GENERATE_CHUNK):
+            size = min(GENERATE_CHUNK, count - start)
+            if distribution == 'clustered':
+                points = centers[rng.integers(0, CLUSTERS, size)] + rng.normal(0, CLUSTER_SIGMA, (size, 2))
+                points = np.clip(points, 0, 1000)
+            else:
+                points = rng.uniform(0, 1000, (size, 2))
+            columns = [np.char.mod('%.6f', points[:, 0]), np.char.mod('%.6f', points[:, 1])]
+            for name, type_name in specs:
+                values = _field_values(rng, name, type_name, start, size)
+                if null_ratio and name != 'id':
+                    values = np.where(rng.random(size) < null_ratio, '', values)
+                columns.append(values)
+            f.writelines(f"DATA:{','.join(row)}\n" for row in zip(*[c.tolist() for c in columns]))
+
+
+def subset_strings(fields):
+    """Типовые строки подмножества для полей набора; последняя объединяет первые две"""
+    subsets = []
+    for name, type_name in (field.split(':', 1) for field in fields.split(',')):
+        type_name = type_name.lower()
+        if name == 'id':
+            subsets.append(f'"{name}" IN (1, 2, 3, 5, 8, 13, 21)')
+        elif type_name in ('int', 'integer'):
+            subsets.append(f'"{name}" >= 500')
+        elif type_name in ('double', 'float'):
+            subsets.append(f'"{name}" < 0.5')
+        elif type_name in ('string', 'text'):
+            subsets.append(f'"{name}" = \'n7\'')
+            subsets.append(f'"{name}" LIKE \'n1%\'')
+        elif type_name in ('date', 'datetime'):
+            subsets.append(f'"{name}" >= \'2010-01-01\'')
+        else:
+            subsets.append(f'"{name}" IS NULL')
+    if len(subsets) > 1:
+        subsets.append(f'{subsets[0]} AND {subsets[1]}')
+    return subsets
+
+
+def start_qgis():
+    from qgis.core import QgsApplication
+    app = QgsApplication([], False)
+    app.initQgis()
+    return app
+
+
+def open_provider(path, provider_dir=REPO_DIR, options=''):
+    sys.path.insert(0, provider_dir)
+    from provider import CustomVectorDataProvider
+    from qgis.core import QgsDataProvider
+    uri = f'myvec://{path}' + (f'?{options}' if options else '')
+    return CustomVectorDataProvider(uri, QgsDataProvider.ProviderOptions())
+
+
+def bench_parsers(path):
+    """Сравнивает построчный и блочный парсеры: пропускная способность и совпадение данных"""
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    provider = open_provider(path)
+    import provider as module
+    datasets = {}
+    throughput = {}
+    for mode in ('lines', 'bulk'):
+        # Разбор в обход реестра: открытый провайдер держит ссылку на запись,
+        # и второе открытие получило бы набор, разобранный первым парсером
+        provider.parser_mode = mode
+        started = time.perf_counter()
+        _, datasets[mode] = provider._parse_file(path, module._LoadFeedback())
+        throughput[mode] = size_mb / (time.perf_counter() - started)
+    lines, bulk = datasets['lines'], datasets['bulk']
+    same = (len(lines) == len(bulk) and
+            (lines.x == bulk.x).all() and (lines.y == bulk.y).all() and
+            all(lines.attributes(row) == bulk.attributes(row) for row in range(len(lines))))
+    return throughput['lines'], throughput['bulk'], same
+
+
+def bench_rect_queries(provider, count, queries=QUERIES):
+    """Среднее время запроса по прямоугольнику с ~постоянным числом попаданий"""
+    from qgis.core import QgsFeatureRequest, QgsRectangle
+    # Сторона окна подбирается так, чтобы в него попадало ~50 точек при любом N
+    side = 1000 * (50 / count) ** 0.5
+    rnd = random.Random(1)
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(queries):
+        x = rnd.uniform(0, 1000 - side)
+        y = rnd.uniform(0, 1000 - side)
+        request = QgsFeatureRequest().setFilterRect(QgsRectangle(x, y, x + side, y + side))
+        hits += sum(1 for _ in provider.getFeatures(request))
+    elapsed = time.perf_counter() - started
+    return elapsed / queries, hits / queries
+
+
+def bench_fid_queries(provider, count):
+    """Среднее время выборки 100 объектов по filterFids"""
+    from qgis.core import QgsFeatureRequest
+    rnd = random.Random(2)
+    started = time.perf_counter()
+    for _ in range(QUERIES):
+        fids = rnd.sample(range(count), 100)
+        request = QgsFeatureRequest().setFilterFids(fids)
+        sum(1 for _ in provider.getFeatures(request))
+    return (time.perf_counter() - started) / QUERIES
+
+
+def bench_workers(path):
+    """Время разбора в зависимости от числа процессов и совпадение с последовательным"""
+    provider = open_provider(path, options='workers=1')
+    import provider as module
+    counts = [1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    results = []
+    reference = None
+    for workers in counts:
+        # Разбор в обход реестра, который вернул бы уже разобранный файл
+        provider.workers = workers
+        started = time.perf_counter()
+        _, dataset = provider._parse_file(path, module._LoadFeedback())
+        elapsed = time.perf_counter() - started
+        if reference is None:
+            reference = dataset
+        same = (len(dataset) == len(reference) and
+                (dataset.x == reference.x).all() and (dataset.y == reference.y).all() and
+                all(dataset.attributes(row) == reference.attributes(row)
+                    for row in range(0, len(dataset), 997)))
+        results.append((workers, elapsed, same))
+    return results
+
+
+def bench_lazy(path, count):
+    """Режим access=lazy: построение индекса строк и первый запрос окна после открытия"""
+    from qgis.core import QgsFeatureRequest, QgsRectangle
+    started = time.perf_counter()
+    open_provider(path, options='access=lazy')
+    build = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    provider = open_provider(path, options='access=lazy')
+    side = 1000 * (50 / count) ** 0.5
+    request = QgsFeatureRequest().setFilterRect(QgsRectangle(500, 500, 500 + side, 500 + side))
+    sum(1 for _ in provider.getFeatures(request))
+    first_paint = time.perf_counter() - started
+    return build, first_paint
+
+
+def bench_lod(path):
+    """Запрос всего экстента на экран шириной 1000 пикселей: без упрощения и с lod=thin"""
+    from qgis.core import (QgsExpressionContext, QgsExpressionContextUtils, QgsFeatureRequest,
+                           QgsMapSettings, QgsRectangle)
+    from qgis.PyQt.QtCore import QSize
+    extent = QgsRectangle(0, 0, 1000, 1000)
+    # Упрощаются только запросы отрисовки: с контекстом настроек карты
+    settings = QgsMapSettings()
+    settings.setExtent(extent)
+    settings.setOutputSize(QSize(1000, 1000))
+    context = QgsExpressionContext([QgsExpressionContextUtils.mapSettingsScope(settings)])
+    request = QgsFeatureRequest().setFilterRect(extent).setExpressionContext(context)
+    times = []
+    for options in ('', 'lod=thin&lod_width=1000'):
+        provider = open_provider(path, options=options)
+        # Пирамида строится при первом запросе
+        sum(1 for _ in provider.getFeatures(request))
+        started = time.perf_counter()
+        sum(1 for _ in provider.getFeatures(request))
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def bench_nearest(provider):
+    """Среднее время поиска 10 ближайших объектов к случайной точке"""
+    from qgis.core import QgsPointXY
+    rnd = random.Random(3)
+    started = time.perf_counter()
+    for _ in range(QUERIES):
+        provider.nearestNeighbor(QgsPointXY(rnd.uniform(0, 1000), rnd.uniform(0, 1000)), 10)
+    return (time.perf_counter() - started) / QUERIES
+
+
+def bench_index_build(provider):
+    """Время построения индекса: пакетная загрузка против QgsSpatialIndex.addFeature"""
+    from provider import _PackedPointIndex
+    from qgis.core import QgsFeature, QgsGeometry, QgsPointXY, QgsSpatialIndex
+    dataset = provider._dataset
+    started = time.perf_counter()
+    _PackedPointIndex.build(dataset.x, dataset.y, np.arange(len(dataset)))
+    packed = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    index = QgsSpatialIndex()
+    feature = QgsFeature()
+    for row, (x, y) in enumerate(zip(dataset.x.tolist(), dataset.y.tolist())):
+        feature.setId(row)
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+        index.addFeature(feature)
+    incremental = time.perf_counter() - started
+    return packed, incremental
+
+
+def bench_filter_index(provider, count):
+    """Индекс после фильтра, оставившего половину строк: общий индекс с маской
+    против отдельного дерева по отобранным строкам.
+
+    Возвращает время получения индекса и среднее время запроса по
+    прямоугольнику для каждого из двух вариантов.
+    """
+    from provider import _PackedPointIndex
+    dataset = provider._dataset
+    provider._subset_string = f'"id" < {count // 2}'
+    provider.apply_filter()
+    # Общий индекс по всем строкам уже построен при открытии файла
+    started = time.perf_counter()
+    masked = provider._index_for(provider._entry, provider._filtered_idx)
+    masked_build = time.perf_counter() - started
+    started = time.perf_counter()
+    dedicated = _PackedPointIndex.build(dataset.x, dataset.y, provider._filtered_idx)
+    dedicated_build = time.perf_counter() - started
+    queries = []
+    for index in (masked, dedicated):
+        provider._spatial_index = index
+        queries.append(bench_rect_queries(provider, count)[0])
+    provider._subset_string = ''
+    provider.apply_filter()
+    provider._build_spatial_index()
+    return masked_build, dedicated_build, queries[0], queries[1]
+
+
+def bench_preview(path):
+    """Открытие файла виджетом предпросмотра (sample=N) с оценкой числа объектов
+    и экстента. Выборка не берется из реестра, поэтому время сравнимо с
+    полной загрузкой в отдельном процессе."""
+    import provider as module
+    started = time.perf_counter()
+    preview = open_provider(path, options=f'sample={module._PREVIEW_ROWS}')
+    preview.featureCount()
+    preview.extent()
+    return time.perf_counter() - started
+
+
+def best_time(function, repeat, setup=None):
+    """Лучшее время из repeat запусков function; setup выполняется перед каждым вне замера"""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_suite(path, count, fields, repeat):
+    """Основные пути провайдера на одном файле: {метрика: секунды}"""
+    from qgis.core import QgsPointXY
+    provider = open_provider(path)
+    import provider as module
+    dataset = provider._dataset
+    results = {}
+    # Разбор в обход реестра, который вернул бы уже разобранный файл
+    results['parse_file'] = best_time(lambda: provider._parse_file(path, module._LoadFeedback()), repeat)
+    
+    for subset in subset_strings(fields):
+        def apply(subset=subset):
+            provider._subset_string = subset
+            provider.apply_filter()
+        results[f'apply_filter {subset}'] = best_time(apply, repeat)
+    provider._subset_string = ''
+    provider.apply_filter()
+    
+    def reset_index():
+        # Индекс по всем строкам хранится в записи реестра и строится один раз
+        provider._entry.full_index = None
+    results['build_spatial_index'] = best_time(provider._build_spatial_index, repeat, reset_index)
+    results['getFeatures rect'] = bench_rect_queries(provider, count)[0]
+    
+    # Допуск 5 пикселей на экране шириной 2048 пикселей, показывающем весь слой
+    rnd = random.Random(4)
+    points = [QgsPointXY(rnd.uniform(0, 1000), rnd.uniform(0, 1000)) for _ in range(QUERIES)]
+    units_per_pixel = 1000 / 2048
+    provider._point_grid = None
+    results['identify first'] = best_time(
+        lambda: provider.identify(points[0], 5, units_per_pixel, None), 1)
+    results['identify'] = best_time(
+        lambda: [provider.identify(point, 5, units_per_pixel, None) for point in points], repeat) / QUERIES
+    
+    def reset_stats():
+        provider._stats = module._LayerStats(dataset, provider._filtered_idx)
+    # Экстент вычисляется вместе со статистикой слоя при смене набора строк
+    results['extent'] = best_time(lambda: (reset_stats(), provider.extent()), repeat)
+    for index in range(len(dataset.fields)):
+        results[f'uniqueValues {dataset.fields[index].name()}'] = best_time(
+            lambda index=index: provider.uniqueValues(index), repeat, reset_stats)
+    return results
+
+
+def environment():
+    """Ревизия и окружение прогона для сопоставления результатов"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, check=True,
+                                  capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {'revision': revision, 'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run_suite(sizes, options, repeat, json_path):
+    """Замеры основных путей на файлах всех размеров; результат печатается и пишется в JSON"""
+    report = {'environment': environment(), 'options': dict(options, repeat=repeat), 'results': []}
+    print(f"{'N':>10} {'метрика':<60} {'время, мс':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes:
+            path = os.path.join(tmp, f'suite_{count}.myvec')
+            write_dataset(path, count, **options)
+            for metric, seconds in bench_suite(path, count, options['fields'], repeat).items():
+                report['results'].append({'rows': count, 'metric': metric, 'seconds': seconds})
+                print(f'{count:>10} {metric:<60} {seconds * 1000:>12.3f}')
+            # Файл на 10 млн строк и его данные в памяти больше не нужны
+            import provider as module
+            module._DATASET_REGISTRY.clear()
+            os.remove(path)
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def compare_runs(old_path, new_path, threshold):
+    """Сравнивает два прогона --suite; возвращает число регрессий"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    if old['options'] != new['options']:
+        print('Внимание: прогоны выполнены с разными параметрами генератора')
+    before = {(r['rows'], r['metric']): r['seconds'] for r in old['results']}
+    regressions = 0
+    print(f"{'N':>10} {'метрика':<60} {'было, мс':>10} {'стало, мс':>10} {'отношение':>10}")
+    for result in new['results']:
+        key = (result['rows'], result['metric'])
+        if key not in before:
+            continue
+        was, now = before[key], result['seconds']
+        ratio = now / was if was else float('inf')
+        mark = ''
+        if now > was * (1 + threshold) and now - was > MIN_REGRESSION_S:
+            mark = 'РЕГРЕССИЯ'
+            regressions += 1
+        elif was > now * (1 + threshold) and was - now > MIN_REGRESSION_S:
+            mark = 'ускорение'
+        print(f'{key[0]:>10} {key[1]:<60} {was * 1000:>10.3f} {now * 1000:>10.3f} {ratio:>10.2f} {mark}')
+    print(f'\nРегрессий (замедление больше {threshold:.0%}): {regressions}')
+    return regressions
+
+
+def load_child(path, provider_dir):
+    """Открывает файл в отдельном процессе и печатает время загрузки, пиковый
+    RSS и среднее время запроса по прямоугольнику"""
+    app = start_qgis()
+    started = time.perf_counter()
+    provider = open_provider(path, provider_dir)
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    count = provider.featureCount()
+    # Первый запрос не в счет: индекс может достраиваться при первом обращении
+    bench_rect_queries(provider, count, 1)
+    rect_time, _ = bench_rect_queries(provider, count, CHILD_QUERIES)
+    print(json.dumps({'load_s': elapsed, 'peak_rss_mb': peak_kb / 1024,
+                      'features': count, 'rect_s': rect_time}))
+    app.exitQgis()
+
+
+def measure_load(path, provider_dir):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--load-child', path,
+         '--provider-dir', provider_dir],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--provider-dir', default=REPO_DIR,
+                        help='каталог с provider.py, загрузку которого сравнить с текущей')
+    parser.add_argument('--load-child', help=argparse.SUPPRESS)
+    parser.add_argument('--sizes', type=lambda value: [int(v) for v in value.split(',')],
+                        help='размеры файлов через запятую')
+    parser.add_argument('--fields', default=DEFAULT_FIELDS, help='поля в формате HEADER')
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='uniform',
+                        help='распределение точек')
+    parser.add_argument('--null-ratio', type=float, default=0.0, help='доля пустых значений')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--generate', metavar='PATH', help='только сгенерировать файл')
+    parser.add_argument('--suite', action='store_true', help='замеры основных путей провайдера')
+    parser.add_argument('--repeat', type=int, default=3, help='повторов каждого замера в --suite')
+    parser.add_argument('--json', metavar='PATH', help='записать результаты --suite в JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='сравнить два JSON-файла --suite')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='замедление, которое считается регрессией (доля)')
+    args = parser.parse_args()
+
+    if args.load_child:
+        load_child(args.load_child, args.provider_dir)
+        return
+    if args.compare:
+        sys.exit(1 if compare_runs(*args.compare, args.threshold) else 0)
+    
+    options = {'seed': args.seed, 'fields': args.fields,
+               'distribution': args.distribution, 'null_ratio': args.null_ratio}
+    if args.generate:
+        write_dataset(args.generate, (args.sizes or SIZES)[0], **options)
+        return
+
+    app = start_qgis()
+    if args.suite:
+        run_suite(args.sizes or SUITE_SIZES, options, args.repeat, args.json)
+        app.exitQgis()
+        return
+    header = f"{'N':>10} {'загрузка, с':>12} {'RSS, МБ':>9}"
+    if args.provider_dir != REPO_DIR:
+        header += f" {'база, с':>9} {'база RSS':>9} {'база rect, мс':>14}"
+    print(header + f" {'rect, мс':>10} {'попаданий':>10} {'fids, мс':>10} {'kNN, мс':>9}"
+          f" {'lines, МБ/с':>12} {'bulk, МБ/с':>11} {'паритет':>8}"
+          f" {'индекс, мс':>11} {'addFeature, мс':>15}"
+          f" {'lazy индекс, с':>15} {'lazy окно, с':>13}"
+          f" {'экстент, с':>11} {'lod, с':>8}"
+          f" {'маска, мс':>10} {'дерево, мс':>11} {'rect маска, мс':>15} {'rect дерево, мс':>16}"
+          f" {'выборка, с':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.sizes or SIZES:
+            path = os.path.join(tmp, f'bench_{count}.myvec')
+            write_dataset(path, count, **options)
+            load = measure_load(path, REPO_DIR)
+            line = f"{count:>10} {load['load_s']:>12.2f} {load['peak_rss_mb']:>9.0f}"
+            if args.provider_dir != REPO_DIR:
+                base = measure_load(path, args.provider_dir)
+                line += (f" {base['load_s']:>9.2f} {base['peak_rss_mb']:>9.0f}"
+                         f" {base['rect_s'] * 1000:>14.3f}")
+            provider = open_provider(path)
+            rect_time, hits = bench_rect_queries(provider, count)
+            fid_time = bench_fid_queries(provider, count)
+            nearest_time = bench_nearest(provider)
+            lines_mbs, bulk_mbs, same = bench_parsers(path)
+            packed_time, incremental_time = bench_index_build(provider)
+            lazy_build, lazy_paint = bench_lazy(path, count)
+            full_render, lod_render = bench_lod(path)
+            masked_build, dedicated_build, masked_rect, dedicated_rect = bench_filter_index(provider, count)
+            sample_open = bench_preview(path)
+            print(line + f' {rect_time * 1000:>10.3f} {hits:>10.1f} {fid_time * 1000:>10.3f}'
+                  f' {nearest_time * 1000:>9.3f}'
+                  f" {lines_mbs:>12.1f} {bulk_mbs:>11.1f} {'да' if same else 'НЕТ':>8}"
+                  f' {packed_time * 1000:>11.1f} {incremental_time * 1000:>15.1f}'
+                  f' {lazy_build:>15.2f} {lazy_paint:>13.3f}'
+                  f' {full_render:>11.2f} {lod_render:>8.3f}'
+                  f' {masked_build * 1000:>10.3f} {dedicated_build * 1000:>11.1f}'
+                  f' {masked_rect * 1000:>15.3f} {dedicated_rect * 1000:>16.3f}'
+                  f' {sample_open:>11.3f}')
+        
+        # Ускорение параллельного разбора на самом большом файле
+        print(f"\n{'процессов':>10} {'разбор, с':>10} {'ускорение':>10} {'паритет':>8}")
+        results = bench_workers(path)
+        for workers, elapsed, same in results:
+            print(f"{workers:>10} {elapsed:>10.2f} {results[0][1] / elapsed:>10.2f}"
+                  f" {'да' if same else 'НЕТ':>8}")
+    app.exitQgis()
+
+
+if __name__ == '__main__':
+    main()
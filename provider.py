@@ -8,18 +8,31 @@ from qgis.core import (
     QgsCoordinateReferenceSystem,
     QgsDataProvider,
     QgsFeatureRequest,
+    QgsFeatureIterator,
+    QgsAbstractFeatureSource,
+    QgsAbstractFeatureIterator,
+    QgsCoordinateTransform,
+    QgsCsException,
     QgsVectorLayer,
     QgsExpression,
+    QgsExpressionNode,
+    QgsExpressionNodeBinaryOperator,
+    QgsExpressionNodeUnaryOperator,
     QgsExpressionContext,
     QgsExpressionContextUtils,
     QgsRectangle,
-    QgsSpatialIndex,
     QgsProject,
     QgsProviderRegistry,
     QgsProviderMetadata,
     QgsVectorDataProviderFactory,
     QgsField,
-    QgsFeatureStore
+    QgsFeatureStore,
+    QgsApplication,
+    QgsErrorMessage,
+    QgsMessageLog,
+    QgsTask,
+    QgsSimplifyMethod,
+    Qgis
 )
 from qgis.gui import (
     QgsDataSourceWidget,
@@ -31,7 +44,7 @@ from qgis.gui import (
     QgsQueryBuilder,
     QgsMapToolIdentify
 )
-from qgis.PyQt.QtCore import QVariant
+from qgis.PyQt.QtCore import QVariant, QDate, QDateTime, Qt, QFileSystemWatcher, QTimer
 from qgis.PyQt.QtWidgets import (
     QWidget, 
     QVBoxLayout, 
@@ -44,116 +57,3215 @@ from qgis.PyQt.QtWidgets import (
     QMessageBox
 )
 from qgis.PyQt.QtGui import QIcon
+from qgis.PyQt import sip
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+import hashlib
+import json
+import mmap
+import multiprocessing
+import operator
+import os
 import random
+import re
+import sys
+import threading
+import time
+import weakref
+
+import numpy as np
+
+# 0. Колоночное хранилище данных
+# Соответствие типов полей типам массивов NumPy; остальные типы хранятся как object
+_NUMPY_DTYPES = {
+    QVariant.Int: np.int64,
+    QVariant.Double: np.float64,
+    QVariant.Bool: np.bool_,
+}
+
+# Размер порции строк, после которой накопленные значения сбрасываются в массивы
+_CHUNK_ROWS = 65536
+
+# Размер блока (в символах), читаемого за раз блочным парсером
+_BLOCK_CHARS = 16 * 1024 * 1024
+
+# Число потомков узла упакованного R-дерева
+_INDEX_NODE_SIZE = 64
+
+# Начиная с этой доли оставшихся после фильтра строк общий индекс
+# переиспользуется с маской вместо построения отдельного
+_MASKED_INDEX_MIN_FRACTION = 0.25
+
+# Среднее число точек в ячейке сетки для поиска по расстоянию
+_GRID_POINTS_PER_CELL = 4
+
+# Среднее число строк в тайле индекса строк (режим access=lazy)
+_LINE_TILE_ROWS = 4096
+
+# Когда дописанных строк становится больше этой доли, индекс по всем
+# строкам перестраивается целиком, а не дополняется цепочкой
+_APPEND_REBUILD_FRACTION = 0.25
+
+# Задержка перед перечитыванием измененного файла: серия записей
+# обрабатывается одним разом
+_RELOAD_DELAY_MS = 500
+
+# Файлы от этого размера при workers=auto разбираются в нескольких процессах
+_PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+# Минимальный размер диапазона, который разбирает один процесс
+_PARALLEL_MIN_RANGE = 1024 * 1024
+
+# Сколько различных значений поля хранится в статистике слоя
+_DISTINCT_SKETCH = 1000
+
+# Пирамида сеток для упрощенной отрисовки (URI lod=thin|aggregate):
+# глубина самого мелкого уровня ограничена, чтобы ключ ячейки умещался в int64
+_LOD_MAX_DEPTH = 24
+
+# Ширина экрана в пикселях по умолчанию для запросов без метода упрощения
+_LOD_DEFAULT_WIDTH = 2048
+
+# Переменная области настроек карты: ее контекст передает в запрос отрисовка
+# слоя на холсте и в макете, но не привязка, таблица атрибутов и обработка
+_LOD_RENDER_VARIABLE = 'map_extent'
+
+# Поле с числом точек в ячейке для режима lod=aggregate
+_LOD_COUNT_FIELD = 'lod_count'
+
+# Предпросмотр (URI sample=N): число строк выборки в виджете, сколько байт
+# читается в точке выборки за раз и предел длины строки (записи POLY бывают
+# длиной в десятки килобайт; более длинные строки пропускаются)
+_PREVIEW_ROWS = 2000
+_SAMPLE_WINDOW = 1024
+_SAMPLE_MAX_LINE = 1024 * 1024
+
+# Вычисляемые поля полигональных слоев: площадь, знаковая площадь внешнего
+# кольца (по формуле Гаусса) и его ориентация ('ccw' или 'cw')
+_POLYGON_FIELDS = (
+    ('poly_area', QVariant.Double),
+    ('poly_signed_area', QVariant.Double),
+    ('poly_orientation', QVariant.String),
+)
+
+# Сколько байт с начала и с конца файла входит в хэш для проверки кэша
+_HASH_BYTES = 1024 * 1024
+
+# Теги типов значений в закодированных колонках object
+_TAG_STR, _TAG_INT, _TAG_FLOAT, _TAG_BOOL = 0, 1, 2, 3
+
+# Типы полей из HEADER и их каноническое имя для сохранения в кэше
+_TYPE_MAP = {
+    'int': QVariant.Int,
+    'integer': QVariant.Int,
+    'double': QVariant.Double,
+    'float': QVariant.Double,
+    'string': QVariant.String,
+    'text': QVariant.String,
+    'date': QVariant.Date,
+    'datetime': QVariant.DateTime,
+    'bool': QVariant.Bool
+}
+_TYPE_NAMES = {
+    QVariant.Int: 'int',
+    QVariant.Double: 'double',
+    QVariant.String: 'string',
+    QVariant.Date: 'date',
+    QVariant.DateTime: 'datetime',
+    QVariant.Bool: 'bool'
+}
+
+
+def _make_fields(field_specs):
+    """Строит QgsFields по списку пар (имя, тип)"""
+    fields = QgsFields()
+    for name, type_name in field_specs:
+        fields.append(QgsField(name, _TYPE_MAP.get(type_name.lower(), QVariant.String)))
+    return fields
+
+
+class _Column:
+    """Типизированная колонка атрибутов: массив значений и маска NULL.
+
+    Колонка object, загруженная из бинарного кэша, хранится в закодированном
+    виде и раскодируется целиком только при первом обращении к values.
+    """
+    __slots__ = ('vtype', '_values', 'nulls', '_encoded')
+
+    def __init__(self, vtype, values, nulls, encoded=None):
+        self.vtype = vtype
+        self._values = values
+        self.nulls = nulls
+        self._encoded = encoded
+
+    def __len__(self):
+        return len(self.nulls)
+
+    @property
+    def values(self):
+        if self._values is None:
+            self._values = _decode_objects(*self._encoded)
+            self._encoded = None
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+        self._encoded = None
+
+    def is_object(self):
+        return self._values is None or self._values.dtype == object
+
+    def nbytes(self):
+        if self._values is None:
+            return sum(part.nbytes for part in self._encoded) + self.nulls.nbytes
+        return self._values.nbytes + self.nulls.nbytes
+
+    @classmethod
+    def empty(cls, vtype):
+        dtype = _NUMPY_DTYPES.get(vtype, object)
+        return cls(vtype, np.empty(0, dtype=dtype), np.empty(0, dtype=bool))
+
+    @classmethod
+    def from_values(cls, vtype, values):
+        """Строит колонку из списка уже сконвертированных значений"""
+        nulls = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+        dtype = _NUMPY_DTYPES.get(vtype)
+        # Значение, которое не удалось сконвертировать, остается строкой;
+        # такая колонка хранится как object, чтобы не потерять исходные данные
+        if dtype is not None and not any(type(v) is str for v in values):
+            try:
+                filled = [0 if v is None else v for v in values]
+                return cls(vtype, np.array(filled, dtype=dtype), nulls)
+            except (OverflowError, ValueError, TypeError):
+                pass
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        return cls(vtype, array, nulls)
+
+    @classmethod
+    def concat(cls, vtype, columns):
+        """Склеивает порции одной колонки в непрерывный массив"""
+        if not columns:
+            return cls.empty(vtype)
+        if len(columns) == 1:
+            return columns[0]
+        if any(c.is_object() for c in columns):
+            values = np.concatenate([c.as_objects() for c in columns])
+        else:
+            values = np.concatenate([c.values for c in columns])
+        return cls(vtype, values, np.concatenate([c.nulls for c in columns]))
+
+    def as_objects(self):
+        """Возвращает значения как массив object с None вместо NULL"""
+        if self.values.dtype == object:
+            return self.values
+        array = self.values.astype(object)
+        array[self.nulls] = None
+        return array
+
+    def raw(self, row):
+        """Значение строки в виде объекта Python (даты остаются строками ISO)"""
+        if self.nulls[row]:
+            return None
+        if self._values is None:
+            return _decode_one(self._encoded, row)
+        value = self._values[row]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def value(self, row):
+        """Значение строки в виде, который ожидает QgsFeature"""
+        return self.to_qgis(self.raw(row))
+
+    def to_qgis(self, value):
+        """Преобразует сохраненное значение в вид, который ожидает QgsFeature"""
+        if value is None:
+            return None
+        if self.vtype == QVariant.Date:
+            return QDate.fromString(value, Qt.ISODate)
+        if self.vtype == QVariant.DateTime:
+            return QDateTime.fromString(value, Qt.ISODate)
+        return value
+
+    def take(self, rows):
+        """Возвращает новую колонку из выбранных строк"""
+        return _Column(self.vtype, self.values[rows], self.nulls[rows])
+
+    def set(self, row, value):
+        """Записывает значение строки (None - NULL).
+
+        Значение, которое не помещается в типизированный массив, переводит
+        колонку в object, как и при разборе файла.
+        """
+        if not self.nulls.flags.writeable:
+            # Колонка из бинарного кэша ссылается на страницы файла
+            self.nulls = self.nulls.copy()
+        values = self.values
+        if value is not None and values.dtype != object:
+            try:
+                converted = values.dtype.type(value)
+                fits = converted == value or value != value
+            except (ValueError, TypeError, OverflowError):
+                fits = False
+            if not fits:
+                values = self.values = self.as_objects()
+        if not values.flags.writeable:
+            values = self.values = values.copy()
+        if value is None:
+            if values.dtype == object:
+                values[row] = None
+            self.nulls[row] = True
+        else:
+            values[row] = value
+            self.nulls[row] = False
+
+
+class _ColumnBuilder:
+    """Накопитель значений колонки, сбрасывающий их в массивы порциями"""
+
+    def __init__(self, vtype):
+        self.vtype = vtype
+        self._pending = []
+        self._chunks = []
+
+    def append(self, value):
+        self._pending.append(value)
+        if len(self._pending) >= _CHUNK_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._chunks.append(_Column.from_values(self.vtype, self._pending))
+            self._pending = []
+
+    def finish(self):
+        self.flush()
+        column = _Column.concat(self.vtype, self._chunks)
+        self._chunks = []
+        return column
+
+
+class MyvecDataset:
+    """Разобранный файл MYVEC: координаты и атрибуты в колонках.
+
+    Объекты QgsFeature не хранятся, а создаются по номеру строки при выдаче;
+    номер строки совпадает с fid объекта. У полигонального набора кольца
+    хранятся в polygons, x и y - центры охватывающих прямоугольников, а
+    последние колонки - вычисляемые поля _POLYGON_FIELDS.
+    """
+
+    def __init__(self, fields=None, x=None, y=None, columns=None, polygons=None):
+        self.fields = fields if fields is not None else QgsFields()
+        self.x = x if x is not None else np.empty(0, dtype=np.float64)
+        self.y = y if y is not None else np.empty(0, dtype=np.float64)
+        self.columns = columns if columns is not None else []
+        self.polygons = polygons
+
+    @classmethod
+    def from_polygons(cls, fields, columns, polygons):
+        """Полигональный набор: поля файла дополняются вычисляемыми полями"""
+        dataset = cls(_polygon_fields(fields),
+                      (polygons.xmin + polygons.xmax) / 2, (polygons.ymin + polygons.ymax) / 2,
+                      list(columns) + [None] * len(_POLYGON_FIELDS), polygons)
+        dataset.update_polygon_fields()
+        return dataset
+
+    def update_polygon_fields(self):
+        """Пересчитывает площадь и ориентацию после разбора или правки колец"""
+        area, signed, ccw = self.polygons.measures()
+        # У вырожденного кольца (нулевая площадь) ориентации нет
+        degenerate = signed == 0
+        orientation = np.where(ccw, 'ccw', 'cw').astype(object)
+        orientation[degenerate] = None
+        no_nulls = np.zeros(len(signed), dtype=bool)
+        first = len(self.columns) - len(_POLYGON_FIELDS)
+        self.columns[first:] = [_Column(QVariant.Double, area, no_nulls),
+                                _Column(QVariant.Double, signed, no_nulls.copy()),
+                                _Column(QVariant.String, orientation, degenerate)]
+
+    def __len__(self):
+        return len(self.x)
+
+    def attributes(self, row):
+        return [column.value(row) for column in self.columns]
+
+    def geometry(self, row):
+        if self.polygons is not None:
+            return QgsGeometry.fromPolygonXY(self.polygons.rings(row))
+        return QgsGeometry.fromPointXY(QgsPointXY(float(self.x[row]), float(self.y[row])))
+
+    def feature(self, row, feature=None):
+        """Создает (или заполняет переданный) QgsFeature для строки"""
+        if feature is None:
+            feature = QgsFeature(self.fields)
+        feature.setId(int(row))
+        feature.setGeometry(self.geometry(row))
+        feature.setAttributes(self.attributes(row))
+        feature.setValid(True)
+        return feature
+
+    def take(self, rows):
+        """Набор из строк rows (в их порядке)"""
+        return MyvecDataset(self.fields, self.x[rows], self.y[rows],
+                            [column.take(rows) for column in self.columns],
+                            self.polygons.take(rows) if self.polygons is not None else None)
+
+    def nbytes(self):
+        """Приблизительный объем памяти, занятый массивами"""
+        total = self.x.nbytes + self.y.nbytes
+        for column in self.columns:
+            total += column.nbytes()
+        if self.polygons is not None:
+            total += self.polygons.nbytes()
+        return total
+
+
+def _encode_objects(values, nulls):
+    """Кодирует колонку object для кэша: теги типов, смещения и UTF-8 данные"""
+    tags = np.zeros(len(values), dtype=np.uint8)
+    parts = []
+    for i, value in enumerate(values.tolist()):
+        if value is None or nulls[i]:
+            text = ''
+        elif isinstance(value, bool):
+            tags[i] = _TAG_BOOL
+            text = '1' if value else ''
+        elif isinstance(value, int):
+            tags[i] = _TAG_INT
+            text = str(value)
+        elif isinstance(value, float):
+            tags[i] = _TAG_FLOAT
+            text = repr(value)
+        else:
+            text = str(value)
+        parts.append(text.encode('utf-8'))
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum([len(part) for part in parts], out=offsets[1:])
+    return tags, offsets, np.frombuffer(b''.join(parts), dtype=np.uint8)
+
+
+def _decode_value(tag, text):
+    if tag == _TAG_INT:
+        return int(text)
+    if tag == _TAG_FLOAT:
+        return float(text)
+    if tag == _TAG_BOOL:
+        return text == '1'
+    return text
+
+
+def _decode_one(encoded, row):
+    tags, offsets, blob = encoded
+    text = blob[offsets[row]:offsets[row + 1]].tobytes().decode('utf-8')
+    return _decode_value(tags[row], text)
+
+
+def _decode_objects(tags, offsets, blob):
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    values = np.empty(len(tags), dtype=object)
+    if not tags.any():
+        values[:] = [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(tags))]
+    else:
+        values[:] = [_decode_value(tag, data[bounds[i]:bounds[i + 1]].decode('utf-8'))
+                     for i, tag in enumerate(tags.tolist())]
+    return values
+
+
+# 0.1 Пространственный индекс
+def _hilbert_keys(x, y, bits=16):
+    """Индексы точек на кривой Гильберта порядка bits (векторно)"""
+    n = 1 << bits
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.any():
+        return np.zeros(len(x), dtype=np.int64)
+    xmin, xmax = x[finite].min(), x[finite].max()
+    ymin, ymax = y[finite].min(), y[finite].max()
+    xi = np.zeros(len(x), dtype=np.int64)
+    yi = np.zeros(len(y), dtype=np.int64)
+    xi[finite] = ((x[finite] - xmin) / ((xmax - xmin) or 1.0) * (n - 1)).astype(np.int64)
+    yi[finite] = ((y[finite] - ymin) / ((ymax - ymin) or 1.0) * (n - 1)).astype(np.int64)
+    keys = np.zeros(len(x), dtype=np.int64)
+    s = n // 2
+    while s > 0:
+        rx = (xi & s) > 0
+        ry = (yi & s) > 0
+        keys += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        # Поворот квадранта
+        flip = ~ry & rx
+        xi[flip] = n - 1 - xi[flip]
+        yi[flip] = n - 1 - yi[flip]
+        swap = ~ry
+        xi[swap], yi[swap] = yi[swap], xi[swap].copy()
+        s //= 2
+    return keys
+
+
+def _expand_nodes(nodes, node_size, limit):
+    """Номера потомков для списка узлов упакованного дерева"""
+    children = (nodes[:, None] * node_size + np.arange(node_size)).ravel()
+    return children[children < limit]
+
+
+class _PackedPointIndex:
+    """Упакованное R-дерево над точками.
+
+    Строится пакетной загрузкой: точки сортируются по кривой Гильберта и
+    группируются в листья по _INDEX_NODE_SIZE, узлы верхних уровней
+    объединяют по _INDEX_NODE_SIZE соседних узлов. Все данные хранятся в
+    массивах, поэтому индекс сохраняется в кэш и загружается без перестроения.
+    """
+
+    def __init__(self, order, levels, x, y):
+        self.order = order      # номера строк в порядке листьев
+        self.levels = levels    # [(minx, miny, maxx, maxy)], уровень 0 - листья
+        self._x = x
+        self._y = y
+
+    def __len__(self):
+        return len(self.order)
+
+    @classmethod
+    def build(cls, x, y, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        order = rows[np.argsort(_hilbert_keys(x[rows], y[rows]), kind='stable')]
+        levels = []
+        if len(order):
+            xs = x[order]
+            ys = y[order]
+            starts = np.arange(0, len(order), _INDEX_NODE_SIZE)
+            # fmin/fmax пропускают NaN, чтобы одна плохая точка не "ломала" узел
+            level = (np.fmin.reduceat(xs, starts), np.fmin.reduceat(ys, starts),
+                     np.fmax.reduceat(xs, starts), np.fmax.reduceat(ys, starts))
+            levels.append(level)
+            while len(level[0]) > 1:
+                starts = np.arange(0, len(level[0]), _INDEX_NODE_SIZE)
+                level = (np.fmin.reduceat(level[0], starts), np.fmin.reduceat(level[1], starts),
+                         np.fmax.reduceat(level[2], starts), np.fmax.reduceat(level[3], starts))
+                levels.append(level)
+        return cls(order, levels, x, y)
+
+    def intersects(self, rect):
+        """Номера строк, точки которых лежат в прямоугольнике"""
+        return self.query(rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum())
+
+    def query(self, xmin, ymin, xmax, ymax):
+        if not self.levels:
+            return np.empty(0, dtype=np.int64)
+        nodes = np.arange(len(self.levels[-1][0]))
+        for depth in range(len(self.levels) - 1, -1, -1):
+            minx, miny, maxx, maxy = self.levels[depth]
+            hit = ((minx[nodes] <= xmax) & (maxx[nodes] >= xmin) &
+                   (miny[nodes] <= ymax) & (maxy[nodes] >= ymin))
+            nodes = nodes[hit]
+            limit = len(self.levels[depth - 1][0]) if depth else len(self.order)
+            nodes = _expand_nodes(nodes, _INDEX_NODE_SIZE, limit)
+        rows = self.order[nodes]
+        xs = self._x[rows]
+        ys = self._y[rows]
+        return rows[(xs >= xmin) & (xs <= xmax) & (ys >= ymin) & (ys <= ymax)]
+
+    def nbytes(self):
+        return sum(values.nbytes for values in self.to_arrays().values())
+
+    def to_arrays(self):
+        arrays = {'order': self.order}
+        for depth, level in enumerate(self.levels):
+            for name, values in zip(('minx', 'miny', 'maxx', 'maxy'), level):
+                arrays[f'level{depth}.{name}'] = values
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, x, y):
+        levels = []
+        while f'level{len(levels)}.minx' in arrays:
+            prefix = f'level{len(levels)}.'
+            levels.append(tuple(arrays[prefix + name] for name in ('minx', 'miny', 'maxx', 'maxy')))
+        return cls(arrays['order'], levels, x, y)
+
+
+class _MaskedIndex:
+    """Индекс по всем строкам, ограниченный маской отфильтрованных строк.
+
+    При смене фильтра, оставившего заметную долю строк, дешевле отбросить
+    лишние попадания общего индекса, чем строить отдельное дерево.
+    """
+
+    def __init__(self, index, mask):
+        self._index = index
+        self._mask = mask
+
+    def __len__(self):
+        return int(self._mask.sum())
+
+    def intersects(self, rect):
+        return self.query(rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum())
+
+    def query(self, xmin, ymin, xmax, ymax):
+        rows = self._index.query(xmin, ymin, xmax, ymax)
+        return rows[self._mask[rows]]
+
+
+class _IndexChain:
+    """Индекс по всем строкам файла, к которому дописывались строки.
+
+    Упакованное дерево не дополняется, поэтому для дописанных строк
+    строятся отдельные деревья; запрос объединяет ответы всех деревьев.
+    """
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes)
+
+    def appended_rows(self):
+        return sum(len(index) for index in self.indexes[1:])
+
+    def nbytes(self):
+        return sum(index.nbytes() for index in self.indexes)
+
+    def intersects(self, rect):
+        return self.query(rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum())
+
+    def query(self, xmin, ymin, xmax, ymax):
+        return np.concatenate([index.query(xmin, ymin, xmax, ymax) for index in self.indexes])
+
+
+# 0.2 Бинарный кэш разобранного файла
+def _prefix_digest(f, end):
+    """Быстрый хэш первых end байт открытого файла (начало и конец диапазона)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(end).encode())
+    f.seek(0)
+    digest.update(f.read(min(_HASH_BYTES, end)))
+    if end > _HASH_BYTES:
+        start = max(_HASH_BYTES, end - _HASH_BYTES)
+        f.seek(start)
+        digest.update(f.read(end - start))
+    return digest.hexdigest()
+
+
+def _file_signature(path):
+    """Размер, время изменения и быстрый хэш (начало и конец файла)"""
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        digest = _prefix_digest(f, stat.st_size)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest}
+
+
+def _source_state(path, end=None):
+    """(размер, хэш, заканчивается ли переводом строки) первых end байт файла"""
+    with open(path, 'rb') as f:
+        if end is None:
+            end = os.fstat(f.fileno()).st_size
+        complete = True
+        if end:
+            f.seek(end - 1)
+            complete = f.read(1) == b'\n'
+        return end, _prefix_digest(f, end), complete
+
+
+# Выравнивание массивов в бинарных файлах кэша и индекса
+_ARRAY_ALIGN = 64
+
+
+def _read_array_file(path, magic, source_path):
+    """Читает файл с JSON-заголовком и выровненными массивами.
+
+    Возвращает (заголовок, массивы) или None, если файла нет, он другого
+    формата или записан для другой версии исходного файла. Массивы
+    ссылаются на страницы файла, отображенного в память.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(magic)) != magic:
+                return None
+            header_len = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(header_len).decode('utf-8'))
+            if header['signature'] != _file_signature(source_path):
+                return None
+            # ACCESS_COPY: страницы копируются только при записи в массив
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    except (OSError, ValueError, KeyError) as e:
+        QgsMessageLog.logMessage(f"Ошибка чтения {path}: {str(e)}", 'MYVEC', Qgis.Warning)
+        return None
+    
+    arrays = {}
+    for name, (dtype, count, offset) in header['arrays'].items():
+        if count:
+            arrays[name] = np.frombuffer(buffer, dtype=np.dtype(dtype), count=count, offset=offset)
+        else:
+            arrays[name] = np.empty(0, dtype=np.dtype(dtype))
+    return header, arrays
+
+
+def _write_array_file(path, magic, source_path, header, arrays):
+    """Записывает заголовок (с сигнатурой исходного файла) и массивы атомарно"""
+    header = dict(header, signature=_file_signature(source_path), arrays={})
+    # Смещения зависят от длины заголовка, поэтому считаем их с запасом
+    offset = 0
+    layout = []
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        layout.append((name, values, offset))
+        offset += -(-values.nbytes // _ARRAY_ALIGN) * _ARRAY_ALIGN
+    base = 0
+    while True:
+        header['arrays'] = {name: [values.dtype.str, len(values), base + rel]
+                            for name, values, rel in layout}
+        encoded = json.dumps(header).encode('utf-8')
+        start = len(magic) + 8 + len(encoded)
+        aligned = -(-start // _ARRAY_ALIGN) * _ARRAY_ALIGN
+        if aligned <= base:
+            break
+        base = aligned
+    
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(magic)
+            f.write(len(encoded).to_bytes(8, 'little'))
+            f.write(encoded)
+            for name, values, rel in layout:
+                f.seek(base + rel)
+                f.write(values.tobytes())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        QgsMessageLog.logMessage(f"Не удалось записать {path}: {str(e)}", 'MYVEC', Qgis.Warning)
+
+
+class _SidecarCache:
+    """Бинарный файл <файл>.mvcache рядом с исходным.
+
+    Формат: сигнатура, длина и JSON-заголовок, затем выровненные массивы
+    координат, колонок и пространственного индекса. При открытии файл
+    отображается в память (mmap) целиком, массивы ссылаются на его страницы.
+    Кэш считается устаревшим, если у исходного файла изменились размер,
+    время изменения или хэш.
+    """
+    MAGIC = b'MYVECCACHE1\n'
+
+    def __init__(self, source_path):
+        self.source_path = source_path
+        self.path = source_path + '.mvcache'
+
+    def load(self):
+        """Возвращает (описание полей, набор данных, индекс) или None"""
+        loaded = _read_array_file(self.path, self.MAGIC, self.source_path)
+        if loaded is None:
+            return None
+        header, arrays = loaded
+        
+        fields = _make_fields(header['fields'])
+        columns = []
+        for i, (name, type_name) in enumerate(header['fields']):
+            vtype = _TYPE_MAP.get(type_name, QVariant.String)
+            nulls = arrays[f'col{i}.nulls'].view(bool)
+            if f'col{i}.values' in arrays:
+                values = arrays[f'col{i}.values']
+                columns.append(_Column(vtype, values.view(bool) if vtype == QVariant.Bool else values, nulls))
+            else:
+                encoded = (arrays[f'col{i}.tags'], arrays[f'col{i}.offsets'], arrays[f'col{i}.blob'])
+                columns.append(_Column(vtype, None, nulls, encoded))
+        dataset = MyvecDataset(fields, arrays['x'], arrays['y'], columns)
+        index_arrays = {name[len('index.'):]: values for name, values in arrays.items()
+                        if name.startswith('index.')}
+        index = _PackedPointIndex.from_arrays(index_arrays, dataset.x, dataset.y)
+        return header['fields'], dataset, index
+
+    def save(self, field_specs, dataset, index):
+        arrays = {'x': dataset.x, 'y': dataset.y}
+        for i, column in enumerate(dataset.columns):
+            arrays[f'col{i}.nulls'] = column.nulls.view(np.uint8)
+            if column.is_object():
+                tags, offsets, blob = _encode_objects(column.values, column.nulls)
+                arrays[f'col{i}.tags'] = tags
+                arrays[f'col{i}.offsets'] = offsets
+                arrays[f'col{i}.blob'] = blob
+            else:
+                values = column.values
+                arrays[f'col{i}.values'] = values.view(np.uint8) if values.dtype == bool else values
+        for name, values in index.to_arrays().items():
+            arrays[f'index.{name}'] = values
+        _write_array_file(self.path, self.MAGIC, self.source_path, {'fields': field_specs}, arrays)
+
+
+class _IndexFile:
+    """Пространственный индекс по всем строкам в файле <файл>.mvidx.
+
+    Используется без кэша данных: файл по-прежнему разбирается, но индекс
+    не строится заново, пока исходный файл не изменился.
+    """
+    MAGIC = b'MYVECINDEX1\n'
+
+    def __init__(self, source_path):
+        self.source_path = source_path
+        self.path = source_path + '.mvidx'
+
+    def load(self, dataset):
+        loaded = _read_array_file(self.path, self.MAGIC, self.source_path)
+        if loaded is None:
+            return None
+        header, arrays = loaded
+        if header.get('rows') != len(dataset):
+            return None
+        return _PackedPointIndex.from_arrays(arrays, dataset.x, dataset.y)
+
+    def save(self, dataset, index):
+        _write_array_file(self.path, self.MAGIC, self.source_path,
+                          {'rows': len(dataset)}, index.to_arrays())
+
+
+# 0.3 Общий реестр разобранных файлов
+class _DatasetEntry:
+    """Разобранный файл, общий для всех провайдеров, открывших его"""
+
+    def __init__(self, field_specs, dataset, full_index=None):
+        self.field_specs = field_specs
+        self.dataset = dataset
+        # Индекс по всем строкам строится один раз на все провайдеры
+        self.full_index = full_index
+        # Атрибутивные индексы: номер поля -> _AttributeIndex
+        self.attribute_indexes = {}
+        self.refs = 0
+        # Разобранная часть файла: (размер, хэш, заканчивается ли переводом
+        # строки) или None, если файл менялся во время разбора
+        self.source_state = None
+        # Состояние записи, которую эта дополняет дописанными строками
+        self.extends = None
+        # Удаленные строки (правки из журнала); fid остальных не меняются
+        self.deleted = np.zeros(len(dataset), dtype=bool)
+        # Число примененных правок и провайдеры, подключенные к записи:
+        # правка в одном из них обновляет отбор строк во всех
+        self.edits = 0
+        self.providers = weakref.WeakSet()
+
+    def nbytes(self):
+        total = self.dataset.nbytes()
+        if self.full_index is not None:
+            total += self.full_index.nbytes()
+        for index in self.attribute_indexes.values():
+            total += index.nbytes()
+        return total
+
+
+class _DatasetRegistry:
+    """Реестр разобранных файлов с подсчетом ссылок.
+
+    Ключ записи - (путь, время изменения, размер), поэтому измененный файл
+    разбирается заново. Записи без ссылок остаются в памяти для повторного
+    открытия и вытесняются в порядке LRU, когда общий объем превышает бюджет.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def acquire(self, path, loader):
+        """Возвращает запись для файла, загружая ее через loader при промахе.
+
+        loader() возвращает _DatasetEntry или None, если файл не удалось
+        разобрать; такие результаты в реестре не сохраняются.
+        """
+        key = self._key(path)
+        if key is not None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refs += 1
+                    self._entries.move_to_end(key)
+                    return entry
+        
+        entry = loader()
+        if entry is None or key is None:
+            return entry
+        with self._lock:
+            # Файл могли загрузить параллельно: используем уже сохраненную запись
+            existing = self._entries.get(key)
+            if existing is not None:
+                entry = existing
+            else:
+                self._entries[key] = entry
+            entry.refs += 1
+            self._entries.move_to_end(key)
+            self._evict()
+        return entry
+
+    def release(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            self._evict()
+
+    def set_budget(self, budget_bytes):
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            self._evict()
+
+    def clear(self):
+        """Удаляет записи, на которые нет ссылок"""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.refs <= 0]:
+                del self._entries[key]
+
+    def _evict(self):
+        total = sum(entry.nbytes() for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.budget_bytes:
+                break
+            entry = self._entries[key]
+            # Используемые записи не вытесняются
+            if entry.refs <= 0:
+                total -= entry.nbytes()
+                del self._entries[key]
+
+
+_DATASET_REGISTRY = _DatasetRegistry(
+    int(os.environ.get('MYVEC_CACHE_BUDGET_MB', '1024')) * 1024 * 1024)
+
+
+# 0.4 Компиляция выражений в векторные предикаты
+# Точность сравнения чисел, как у qgsDoubleNear в движке выражений QGIS
+_DOUBLE_EPSILON = 4 * np.finfo(np.float64).eps
+
+
+class _UnsupportedExpression(Exception):
+    """Часть выражения не поддерживается компилятором"""
+
+
+def _is_null_literal(value):
+    return value is None or (isinstance(value, QVariant) and value.isNull())
+
+
+def _like_regex(pattern, case_sensitive):
+    """Переводит шаблон LIKE в регулярное выражение, как это делает QGIS"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern) and pattern[i + 1] in '%_':
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return re.compile(''.join(parts), 0 if case_sensitive else re.IGNORECASE)
+
+
+def _map_distinct(values, nulls, predicate):
+    """Вычисляет predicate один раз на каждое различное непустое значение"""
+    result = np.zeros(len(values), dtype=bool)
+    present = np.flatnonzero(~nulls)
+    if len(present):
+        distinct, inverse = np.unique(values[present], return_inverse=True)
+        matched = np.fromiter((predicate(value) for value in distinct.tolist()),
+                              dtype=bool, count=len(distinct))
+        result[present] = matched[inverse.ravel()]
+    return result
+
+
+class _Operand:
+    """Операнд сравнения: колонка набора данных или литерал"""
+
+    def __init__(self, kind, column=None, value=None):
+        self.kind = kind          # 'num' или 'str'
+        self.column = column      # _Column или None для литерала
+        self.value = value        # значение литерала (None - NULL)
+
+    def is_literal(self):
+        return self.column is None
+
+    def data(self, rows):
+        """Значения и маска NULL для строк rows (None - все строки)"""
+        values = self.column.values
+        nulls = self.column.nulls
+        if rows is not None:
+            values = values[rows]
+            nulls = nulls[rows]
+        if self.kind == 'num':
+            return values.astype(np.float64), nulls
+        # В строковых колонках NULL хранится как None: заменяем для сравнений
+        if nulls.any():
+            values = values.copy()
+            values[nulls] = ''
+        return values, nulls
+
+
+class _PredicateCompiler:
+    """Компилирует выражение QGIS в векторный предикат над колонками.
+
+    Поддерживаются сравнения, AND/OR/NOT, IN, IS [NOT] NULL, LIKE/ILIKE и
+    BETWEEN над числовыми, логическими и строковыми полями. Предикат
+    принимает массив номеров строк (или None для всех строк) и возвращает
+    маски "истина" и "NULL" с трехзначной логикой QGIS.
+    """
+
+    def __init__(self, dataset, indexes=None):
+        self.dataset = dataset
+        self.indexes = indexes or {}
+        B = QgsExpressionNodeBinaryOperator
+        self._comparisons = {B.boEQ: 'eq', B.boNE: 'ne', B.boLT: 'lt',
+                             B.boLE: 'le', B.boGT: 'gt', B.boGE: 'ge'}
+        self._mirrored = {'eq': 'eq', 'ne': 'ne', 'lt': 'gt', 'le': 'ge', 'gt': 'lt', 'ge': 'le'}
+        self._likes = {B.boLike: (True, False), B.boNotLike: (True, True),
+                       B.boILike: (False, False), B.boNotILike: (False, True)}
+
+    def compile(self, expression):
+        """Возвращает предикат или None, если выражение не поддерживается"""
+        root = expression.rootNode()
+        if root is None:
+            return None
+        try:
+            return self._boolean(root)
+        except _UnsupportedExpression:
+            return None
+
+    def index_candidates(self, expression):
+        """Строки, отобранные атрибутивными индексами, или None.
+
+        Результат - надмножество строк, для которых выражение истинно;
+        точный результат дает предикат, вычисленный только на этих строках.
+        """
+        root = expression.rootNode()
+        if root is None or not self.indexes:
+            return None
+        try:
+            return self._candidates(root)
+        except _UnsupportedExpression:
+            return None
+
+    def _candidates(self, node):
+        B = QgsExpressionNodeBinaryOperator
+        node_type = node.nodeType()
+        if node_type == QgsExpressionNode.ntBinaryOperator:
+            op = node.op()
+            if op in (B.boAnd, B.boOr):
+                left = self._candidates(node.opLeft())
+                right = self._candidates(node.opRight())
+                if op == B.boAnd:
+                    if left is None or right is None:
+                        return right if left is None else left
+                    return np.intersect1d(left, right, assume_unique=True)
+                if left is None or right is None:
+                    return None
+                return np.union1d(left, right)
+            if op in self._comparisons:
+                return self._index_compare(self._comparisons[op], node.opLeft(), node.opRight())
+            if op == B.boIs:
+                index, other = self._indexed_operand(node.opLeft(), node.opRight())
+                if index is not None and other.kind == 'null':
+                    return index.null_rows
+            return None
+        if node_type == QgsExpressionNode.ntInOperator and not node.isNotIn():
+            index, _ = self._indexed_operand(node.node(), None)
+            if index is None:
+                return None
+            items = [self._operand(item) for item in node.list().list()]
+            kind = 'num' if index.is_numeric() else 'str'
+            if any(not item.is_literal() or item.kind not in ('null', kind) for item in items):
+                return None
+            return index.rows_in([item.value for item in items if item.kind != 'null'])
+        if (node_type == getattr(QgsExpressionNode, 'ntBetweenOperator', None) and
+                not node.isNegative()):
+            low = self._index_compare('ge', node.node(), node.lowerBound())
+            high = self._index_compare('le', node.node(), node.higherBound())
+            if low is None or high is None:
+                return None
+            return np.intersect1d(low, high, assume_unique=True)
+        return None
+
+    def _indexed_operand(self, node, other_node):
+        """Индекс поля из node и операнд other_node, если поле проиндексировано"""
+        if node.nodeType() != QgsExpressionNode.ntColumnRef:
+            return None, None
+        index = self.indexes.get(self.dataset.fields.lookupField(node.name()))
+        if index is None:
+            return None, None
+        return index, (self._operand(other_node) if other_node is not None else None)
+
+    def _index_compare(self, op, left_node, right_node):
+        index, other = self._indexed_operand(left_node, right_node)
+        if index is None:
+            index, other = self._indexed_operand(right_node, left_node)
+            op = self._mirrored[op]
+        if index is None or not other.is_literal():
+            return None
+        if other.kind == 'null':
+            return np.empty(0, dtype=np.int64)
+        if other.kind != ('num' if index.is_numeric() else 'str'):
+            return None
+        value = other.value
+        if op == 'eq':
+            return index.rows_equal(value)
+        if op in ('lt', 'le'):
+            return index.rows_range(high=value)
+        if op in ('gt', 'ge'):
+            return index.rows_range(low=value)
+        return None
+
+    # Логические узлы
+    def _boolean(self, node):
+        node_type = node.nodeType()
+        if node_type == QgsExpressionNode.ntBinaryOperator:
+            return self._binary(node)
+        if node_type == QgsExpressionNode.ntUnaryOperator:
+            if node.op() != QgsExpressionNodeUnaryOperator.uoNot:
+                raise _UnsupportedExpression()
+            inner = self._boolean(node.operand())
+            
+            def negate(rows):
+                true, null = inner(rows)
+                return ~true & ~null, null
+            return negate
+        if node_type == QgsExpressionNode.ntInOperator:
+            return self._in(node)
+        if node_type == getattr(QgsExpressionNode, 'ntBetweenOperator', None):
+            return self._between(node)
+        if node_type in (QgsExpressionNode.ntColumnRef, QgsExpressionNode.ntLiteral):
+            return self._truth(self._operand(node))
+        raise _UnsupportedExpression()
+
+    def _binary(self, node):
+        B = QgsExpressionNodeBinaryOperator
+        op = node.op()
+        if op in (B.boAnd, B.boOr):
+            left = self._boolean(node.opLeft())
+            right = self._boolean(node.opRight())
+            if op == B.boAnd:
+                def both(rows):
+                    lt, ln = left(rows)
+                    rt, rn = right(rows)
+                    false = (~lt & ~ln) | (~rt & ~rn)
+                    true = lt & rt
+                    return true, ~true & ~false
+                return both
+            
+            def either(rows):
+                lt, ln = left(rows)
+                rt, rn = right(rows)
+                true = lt | rt
+                return true, ~true & (ln | rn)
+            return either
+        if op in self._comparisons:
+            return self._compare(self._comparisons[op], node.opLeft(), node.opRight())
+        if op in (B.boIs, B.boIsNot):
+            return self._is_null(node, op == B.boIsNot)
+        if op in self._likes:
+            return self._like(node, *self._likes[op])
+        raise _UnsupportedExpression()
+
+    # Операнды
+    def _operand(self, node):
+        node_type = node.nodeType()
+        if node_type == QgsExpressionNode.ntColumnRef:
+            index = self.dataset.fields.lookupField(node.name())
+            if index < 0:
+                raise _UnsupportedExpression()
+            column = self.dataset.columns[index]
+            if column.vtype in _NUMPY_DTYPES and not column.is_object():
+                return _Operand('num', column=column)
+            if column.vtype == QVariant.String:
+                return _Operand('str', column=column)
+            # Даты и колонки со смешанными значениями вычисляются движком QGIS
+            raise _UnsupportedExpression()
+        if node_type == QgsExpressionNode.ntLiteral:
+            return self._literal(node.value())
+        if (node_type == QgsExpressionNode.ntUnaryOperator and
+                node.op() == QgsExpressionNodeUnaryOperator.uoMinus):
+            inner = self._operand(node.operand())
+            if inner.is_literal() and inner.kind == 'num' and inner.value is not None:
+                return _Operand('num', value=-inner.value)
+        raise _UnsupportedExpression()
+
+    def _literal(self, value):
+        if _is_null_literal(value):
+            return _Operand('null')
+        if isinstance(value, (bool, int, float)):
+            return _Operand('num', value=float(value))
+        if isinstance(value, str):
+            return _Operand('str', value=value)
+        raise _UnsupportedExpression()
+
+    def _constant(self, rows, true, null=False):
+        count = len(self.dataset) if rows is None else len(rows)
+        return np.full(count, true, dtype=bool), np.full(count, null, dtype=bool)
+
+    def _truth(self, operand):
+        """Значение поля или литерала в логическом контексте"""
+        if operand.kind == 'null':
+            return lambda rows: self._constant(rows, False, True)
+        if operand.kind != 'num':
+            raise _UnsupportedExpression()
+        if operand.is_literal():
+            return lambda rows: self._constant(rows, bool(operand.value))
+        
+        def truth(rows):
+            values, nulls = operand.data(rows)
+            return (values != 0) & ~nulls, nulls
+        return truth
+
+    # Сравнения
+    def _compare(self, op, left_node, right_node):
+        left = self._operand(left_node)
+        right = self._operand(right_node)
+        if left.kind == 'null' or right.kind == 'null':
+            # Сравнение с NULL всегда дает NULL
+            return lambda rows: self._constant(rows, False, True)
+        if left.kind != right.kind:
+            raise _UnsupportedExpression()
+        if left.is_literal() and not right.is_literal():
+            left, right, op = right, left, self._mirrored[op]
+        if left.is_literal():
+            raise _UnsupportedExpression()
+        compare = self._numeric if left.kind == 'num' else self._string
+        
+        def predicate(rows):
+            values, nulls = left.data(rows)
+            if right.is_literal():
+                other = right.value
+            else:
+                other, other_nulls = right.data(rows)
+                nulls = nulls | other_nulls
+            return compare(op, values, other) & ~nulls, nulls
+        return predicate
+
+    @staticmethod
+    def _numeric(op, values, other):
+        diff = values - other
+        if op == 'eq':
+            return np.abs(diff) <= _DOUBLE_EPSILON
+        if op == 'ne':
+            return ~(np.abs(diff) <= _DOUBLE_EPSILON)
+        return {'lt': diff < 0, 'le': diff <= 0, 'gt': diff > 0, 'ge': diff >= 0}[op]
+
+    @staticmethod
+    def _string(op, values, other):
+        result = {'eq': operator.eq, 'ne': operator.ne, 'lt': operator.lt,
+                  'le': operator.le, 'gt': operator.gt, 'ge': operator.ge}[op](values, other)
+        return np.asarray(result, dtype=bool)
+
+    def _is_null(self, node, negative):
+        left = self._operand(node.opLeft())
+        right = self._operand(node.opRight())
+        if left.kind == 'null':
+            left, right = right, left
+        if right.kind != 'null' or left.is_literal():
+            raise _UnsupportedExpression()
+        
+        def predicate(rows):
+            nulls = left.column.nulls if rows is None else left.column.nulls[rows]
+            return (~nulls if negative else nulls.copy()), np.zeros(len(nulls), dtype=bool)
+        return predicate
+
+    def _like(self, node, case_sensitive, negative):
+        left = self._operand(node.opLeft())
+        right = self._operand(node.opRight())
+        if left.kind == 'null' or right.kind == 'null':
+            return lambda rows: self._constant(rows, False, True)
+        if left.kind != 'str' or left.is_literal() or not right.is_literal():
+            raise _UnsupportedExpression()
+        regex = _like_regex(right.value, case_sensitive)
+        
+        def predicate(rows):
+            values, nulls = left.data(rows)
+            matched = _map_distinct(values, nulls, lambda value: regex.fullmatch(value) is not None)
+            if negative:
+                matched = ~matched
+            return matched & ~nulls, nulls
+        return predicate
+
+    def _in(self, node):
+        left = self._operand(node.node())
+        if left.kind == 'null':
+            return lambda rows: self._constant(rows, False, True)
+        if left.is_literal():
+            raise _UnsupportedExpression()
+        items = [self._operand(item) for item in node.list().list()]
+        if any(not item.is_literal() for item in items):
+            raise _UnsupportedExpression()
+        list_has_null = any(item.kind == 'null' for item in items)
+        literals = [item.value for item in items if item.kind != 'null']
+        if any(item.kind not in ('null', left.kind) for item in items):
+            raise _UnsupportedExpression()
+        negative = node.isNotIn()
+        
+        def predicate(rows):
+            values, nulls = left.data(rows)
+            if left.kind == 'num':
+                found = np.zeros(len(values), dtype=bool)
+                for literal in literals:
+                    found |= np.abs(values - literal) <= _DOUBLE_EPSILON
+            else:
+                wanted = set(literals)
+                found = _map_distinct(values, nulls, lambda value: value in wanted)
+            # Если совпадения нет, а в списке есть NULL, результат - NULL
+            null = nulls | (~found & list_has_null)
+            true = (~found if negative else found) & ~null
+            return true, null
+        return predicate
+
+    def _between(self, node):
+        lower = self._compare('ge', node.node(), node.lowerBound())
+        upper = self._compare('le', node.node(), node.higherBound())
+        negative = node.isNegative()
+        
+        def predicate(rows):
+            lt, ln = lower(rows)
+            ut, un = upper(rows)
+            false = (~lt & ~ln) | (~ut & ~un)
+            true = lt & ut
+            null = ~true & ~false
+            if negative:
+                return false, null
+            return true, null
+        return predicate
+
+
+# 0.5 Фоновая загрузка
+class _LoadCanceled(Exception):
+    """Загрузка отменена пользователем"""
+
+
+class _LoadFeedback:
+    """Прогресс и отмена загрузки; без задачи ничего не делает"""
+
+    def __init__(self, task=None, scale=1.0):
+        self._task = task
+        # Доля общего прогресса, приходящаяся на разбор файла
+        self._scale = scale
+
+    def set_progress(self, fraction):
+        if self._task is not None:
+            self._task.setProgress(100.0 * self._scale * min(fraction, 1.0))
+
+    def check_canceled(self):
+        if self._task is not None and self._task.isCanceled():
+            raise _LoadCanceled()
+
+
+class _LoadTask(QgsTask):
+    """Разбор файла, фильтрация и построение индекса вне основного потока"""
+
+    def __init__(self, provider):
+        super().__init__(f"Загрузка {os.path.basename(provider.file_path)}", QgsTask.CanCancel)
+        self.provider = provider
+        self.subset_string = provider.subsetString()
+        # Проект читается только в основном потоке: контекст выражений для
+        # фильтра собирается здесь, а в run() используется готовым
+        self.context = provider._expression_context() if self.subset_string else None
+        self.entry = None
+        self.filtered_idx = None
+        self.spatial_index = None
+        self.edits = 0
+        self.error = None
+
+    def run(self):
+        try:
+            # Разбор занимает основную часть времени, индекс - остаток
+            self.entry = self.provider._acquire_entry(_LoadFeedback(self, 0.9))
+            if self.isCanceled():
+                raise _LoadCanceled()
+            self.edits = self.entry.edits
+            self.filtered_idx, self.spatial_index = self.provider._prepare(
+                self.entry, self.subset_string, self.context)
+            self.setProgress(100.0)
+            return True
+        except _LoadCanceled:
+            self.error = "Загрузка файла отменена"
+        except Exception as e:
+            self.error = f"Не удалось загрузить файл: {str(e)}"
+        return False
+
+    def finished(self, result):
+        if sip.isdeleted(self.provider):
+            # Слой удален до окончания загрузки
+            if self.entry is not None:
+                _DATASET_REGISTRY.release(self.entry)
+            return
+        if not result and self.error is None:
+            self.error = "Загрузка файла отменена"
+        if self.error is not None and self.entry is not None:
+            _DATASET_REGISTRY.release(self.entry)
+            self.entry = None
+        self.provider._finish_background_load(self)
+
+
+# 0.6 Атрибутивные индексы
+class _AttributeIndex:
+    """Индекс поля: непустые строки, отсортированные по значению.
+
+    Различные значения (keys) и границы их групп в order позволяют отвечать
+    на диапазонные запросы срезом, а словарь значение -> группа (строится
+    при первом запросе на равенство) - на запросы = и IN за O(1).
+    """
+
+    def __init__(self, column, order, keys, starts, null_rows):
+        self.column = column
+        self.order = order            # номера строк, упорядоченные по значению
+        self.keys = keys              # различные значения по возрастанию
+        self.starts = starts          # начало группы каждого значения в order
+        self.null_rows = null_rows
+        self._groups = None
+
+    @classmethod
+    def build(cls, column):
+        """Строит индекс; возвращает None для колонок со смешанными типами"""
+        present = np.flatnonzero(~column.nulls)
+        values = column.values[present]
+        if column.is_object() and not all(type(v) is str for v in values.tolist()):
+            return None
+        local = np.argsort(values, kind='stable')
+        order = present[local]
+        keys, starts = np.unique(values[local], return_index=True)
+        starts = np.append(starts, len(order)).astype(np.int64)
+        return cls(column, order, keys, starts, np.flatnonzero(column.nulls))
+
+    def is_numeric(self):
+        return not self.column.is_object()
+
+    def _group_rows(self, first, last):
+        """Строки групп first..last-1 (отсортированы по номеру)"""
+        return np.sort(self.order[self.starts[first]:self.starts[last]])
+
+    def rows_equal(self, value):
+        if self.is_numeric():
+            # Числа сравниваются с допуском, как в движке выражений
+            return self.rows_range(value - _DOUBLE_EPSILON, value + _DOUBLE_EPSILON)
+        if self._groups is None:
+            self._groups = {key: i for i, key in enumerate(self.keys.tolist())}
+        group = self._groups.get(value)
+        if group is None:
+            return np.empty(0, dtype=np.int64)
+        return self._group_rows(group, group + 1)
+
+    def rows_in(self, values):
+        parts = [self.rows_equal(value) for value in values]
+        return np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def rows_range(self, low=None, high=None):
+        """Строки со значениями в [low, high] (None - без ограничения)"""
+        first = 0 if low is None else np.searchsorted(self.keys, low, side='left')
+        last = len(self.keys) if high is None else np.searchsorted(self.keys, high, side='right')
+        if first >= last:
+            return np.empty(0, dtype=np.int64)
+        return self._group_rows(first, last)
+
+    def distinct(self):
+        """Различные значения (как объекты Python) и признак наличия NULL"""
+        return self.keys.tolist(), len(self.null_rows) > 0
+
+    def keys_in(self, rows):
+        """Различные значения строк rows по возрастанию - без сортировки:
+        группа значения берется, если в ней есть хотя бы одна из строк"""
+        if len(rows) == len(self.column):
+            return self.keys
+        if not len(self.keys):
+            return self.keys
+        selected = np.zeros(len(self.column), dtype=bool)
+        selected[rows] = True
+        return self.keys[np.logical_or.reduceat(selected[self.order], self.starts[:-1])]
+
+    def nbytes(self):
+        return self.order.nbytes + self.keys.nbytes + self.starts.nbytes + self.null_rows.nbytes
+
+
+# 0.7 Поиск точек по расстоянию
+class _PointGrid:
+    """Равномерная сетка над точками для запросов по расстоянию.
+
+    Строки отсортированы по номеру ячейки (построчно), поэтому ячейки одной
+    строки сетки лежат в order подряд и окно ячеек читается срезами - по
+    одному на строку сетки. Расстояния считаются векторно по координатам.
+    Крупная сетка (много точек на ячейку) служит тайловым индексом файла.
+    """
+
+    def __init__(self, x, y, rows, points_per_cell=_GRID_POINTS_PER_CELL):
+        self._x = x
+        self._y = y
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[np.isfinite(x[rows]) & np.isfinite(y[rows])]
+        self.size = len(rows)
+        if not self.size:
+            self.order = rows
+            return
+        xs = x[rows]
+        ys = y[rows]
+        self.xmin, self.ymin = xs.min(), ys.min()
+        width = xs.max() - self.xmin
+        height = ys.max() - self.ymin
+        cells = max(1, self.size // points_per_cell)
+        # Квадратные ячейки. У вытянутого набора ячейка не меньше длинной
+        # стороны, деленной на число ячеек: иначе nx * ny (и массив starts)
+        # росли бы без предела; вырожденный по одной оси набор - одна полоса
+        self.cell = max((width * height / cells) ** 0.5, max(width, height) / cells) or 1.0
+        self.nx = int(width / self.cell) + 1
+        self.ny = int(height / self.cell) + 1
+        cell_ids = self._cell_y(ys) * self.nx + self._cell_x(xs)
+        local = np.argsort(cell_ids, kind='stable')
+        self.order = rows[local]
+        self.starts = np.searchsorted(cell_ids[local], np.arange(self.nx * self.ny + 1))
+
+    def __len__(self):
+        return self.size
+
+    def to_arrays(self):
+        grid = [self.xmin, self.ymin, self.cell, self.nx, self.ny] if self.size else []
+        arrays = {'order': self.order, 'grid': np.array(grid, dtype=np.float64)}
+        if self.size:
+            arrays['starts'] = self.starts
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, x=None, y=None):
+        """Сетка из сохраненных массивов; без координат доступен только rows_in"""
+        grid = cls.__new__(cls)
+        grid._x = x
+        grid._y = y
+        grid.order = arrays['order']
+        grid.size = len(grid.order)
+        if grid.size:
+            xmin, ymin, cell, nx, ny = arrays['grid'].tolist()
+            grid.xmin, grid.ymin, grid.cell = xmin, ymin, cell
+            grid.nx, grid.ny = int(nx), int(ny)
+            grid.starts = arrays['starts']
+        return grid
+
+    def _cell_x(self, xs):
+        return np.clip(((xs - self.xmin) / self.cell).astype(np.int64), 0, self.nx - 1)
+
+    def _cell_y(self, ys):
+        return np.clip(((ys - self.ymin) / self.cell).astype(np.int64), 0, self.ny - 1)
+
+    def _window(self, ix0, iy0, ix1, iy1):
+        """Строки из ячеек окна [ix0, ix1] x [iy0, iy1] (границы включительно)"""
+        ix0, ix1 = max(ix0, 0), min(ix1, self.nx - 1)
+        iy0, iy1 = max(iy0, 0), min(iy1, self.ny - 1)
+        if ix0 > ix1 or iy0 > iy1:
+            return np.empty(0, dtype=np.int64)
+        parts = [self.order[self.starts[iy * self.nx + ix0]:self.starts[iy * self.nx + ix1 + 1]]
+                 for iy in range(iy0, iy1 + 1)]
+        return np.concatenate(parts)
+
+    def _by_distance(self, rows, px, py):
+        """Строки и расстояния до точки, по возрастанию расстояния (затем номера)"""
+        distances = np.hypot(self._x[rows] - px, self._y[rows] - py)
+        order = np.lexsort((rows, distances))
+        return rows[order], distances[order]
+
+    def _span(self, low, high, origin, count):
+        """Номера ячеек, покрывающих отрезок [low, high], без выхода за сетку"""
+        first = np.floor((low - origin) / self.cell)
+        last = np.floor((high - origin) / self.cell)
+        return int(min(max(first, -1), count)), int(min(max(last, -1), count))
+
+    def rows_in(self, xmin, ymin, xmax, ymax):
+        """Строки из ячеек, пересекающих прямоугольник (без точной проверки), по возрастанию"""
+        if not self.size:
+            return np.empty(0, dtype=np.int64)
+        ix0, ix1 = self._span(xmin, xmax, self.xmin, self.nx)
+        iy0, iy1 = self._span(ymin, ymax, self.ymin, self.ny)
+        return np.sort(self._window(ix0, iy0, ix1, iy1))
+
+    def within(self, px, py, radius):
+        """Строки на расстоянии не больше radius, отсортированные по расстоянию"""
+        if not self.size or not radius >= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        ix0, ix1 = self._span(px - radius, px + radius, self.xmin, self.nx)
+        iy0, iy1 = self._span(py - radius, py + radius, self.ymin, self.ny)
+        rows, distances = self._by_distance(self._window(ix0, iy0, ix1, iy1), px, py)
+        hit = distances <= radius
+        return rows[hit], distances[hit]
+
+    def nearest(self, px, py, k, max_distance=None):
+        """k ближайших строк (не дальше max_distance), отсортированные по расстоянию"""
+        if not self.size or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        limit = np.inf if max_distance is None else max_distance
+        cx, _ = self._span(px, px, self.xmin, self.nx)
+        cy, _ = self._span(py, py, self.ymin, self.ny)
+        # Окно растет кольцами, пока k-я точка не окажется ближе его границы
+        ring = max(1, int(np.ceil((k / _GRID_POINTS_PER_CELL) ** 0.5)))
+        while True:
+            ix0, ix1, iy0, iy1 = cx - ring, cx + ring, cy - ring, cy + ring
+            rows, distances = self._by_distance(self._window(ix0, iy0, ix1, iy1), px, py)
+            # Расстояние, в пределах которого окно содержит все точки сетки
+            covered = np.inf
+            if ix0 > 0:
+                covered = min(covered, px - (self.xmin + ix0 * self.cell))
+            if ix1 < self.nx - 1:
+                covered = min(covered, self.xmin + (ix1 + 1) * self.cell - px)
+            if iy0 > 0:
+                covered = min(covered, py - (self.ymin + iy0 * self.cell))
+            if iy1 < self.ny - 1:
+                covered = min(covered, self.ymin + (iy1 + 1) * self.cell - py)
+            if covered == np.inf or covered > limit or len(rows) >= k and distances[k - 1] < covered:
+                break
+            ring *= 2
+        hit = distances <= limit
+        return rows[hit][:k], distances[hit][:k]
+
+
+# 0.8 Чтение строк файла по запросу
+class _LineIndex:
+    """Таблица смещений строк DATA и тайловый индекс, файл <файл>.mvlines.
+
+    Для режима access=lazy: данные в память не загружаются, исходный файл
+    отображается в память, а разбираются только строки, нужные запросу.
+    Смещения хранятся в порядке fid, тайлы - крупная _PointGrid. Оба
+    массива читаются из файла индекса через mmap, поэтому занятая память
+    определяется запросами, а не размером файла.
+    """
+    MAGIC = b'MYVECLINES1\n'
+
+    def __init__(self, source_path, field_specs, offsets, tiles, extent):
+        self.source_path = source_path
+        self.path = source_path + '.mvlines'
+        self.field_specs = field_specs
+        self.offsets = offsets      # начало строки DATA для каждого fid
+        self.tiles = tiles          # fid, сгруппированные по тайлам
+        self.extent = extent        # [xmin, ymin, xmax, ymax] или []
+        self._buffer = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def build(cls, source_path, field_specs, offsets, x, y):
+        tiles = _PointGrid(x, y, np.arange(len(offsets)), _LINE_TILE_ROWS)
+        # Координаты нужны только для построения; в индексе их не держим
+        tiles = _PointGrid.from_arrays(tiles.to_arrays())
+        finite = np.isfinite(x) & np.isfinite(y)
+        extent = ([float(x[finite].min()), float(y[finite].min()),
+                   float(x[finite].max()), float(y[finite].max())] if finite.any() else [])
+        return cls(source_path, field_specs, offsets, tiles, extent)
+
+    @classmethod
+    def load(cls, source_path):
+        """Индекс, сохраненный для текущей версии файла, или None"""
+        loaded = _read_array_file(source_path + '.mvlines', cls.MAGIC, source_path)
+        if loaded is None:
+            return None
+        header, arrays = loaded
+        tiles = _PointGrid.from_arrays({name[len('tiles.'):]: values for name, values in arrays.items()
+                                        if name.startswith('tiles.')})
+        return cls(source_path, header['fields'], arrays['offsets'], tiles, header['extent'])
+
+    def save(self):
+        arrays = {'offsets': self.offsets}
+        for name, values in self.tiles.to_arrays().items():
+            arrays[f'tiles.{name}'] = values
+        _write_array_file(self.path, self.MAGIC, self.source_path,
+                          {'fields': self.field_specs, 'extent': self.extent}, arrays)
+
+    def lines(self, fids):
+        """Текст строк DATA с указанными fid"""
+        with self._lock:
+            if self._buffer is None:
+                with open(self.source_path, 'rb') as f:
+                    self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = self._buffer
+        result = []
+        for start in self.offsets[fids].tolist():
+            end = buffer.find(b'\n', start)
+            result.append(buffer[start:end if end >= 0 else len(buffer)].decode('utf-8'))
+        return result
+
+
+# 0.9 Параллельный разбор
+def _parse_range(task):
+    """Разбирает диапазон байт [start, end) секции DATA в процессе-обработчике"""
+    file_path, start, end, field_types = task
+    xs, ys = [], []
+    chunks = [[] for _ in field_types]
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        tail = b''
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(_BLOCK_CHARS, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            lines = (tail + block).split(b'\n')
+            tail = lines.pop()
+            CustomVectorDataProvider._parse_block(
+                [line.decode('utf-8') for line in lines], field_types, xs, ys, chunks)
+        if tail:
+            CustomVectorDataProvider._parse_block([tail.decode('utf-8')], field_types, xs, ys, chunks)
+    return (np.concatenate(xs) if xs else np.empty(0, dtype=np.float64),
+            np.concatenate(ys) if ys else np.empty(0, dtype=np.float64),
+            [_Column.concat(vtype, column_chunks) for vtype, column_chunks in zip(field_types, chunks)])
+
+
+# 0.10 Статистика слоя
+class _FieldStats:
+    """Статистика поля по отфильтрованным строкам.
+
+    distinct хранит не больше _DISTINCT_SKETCH различных значений (для
+    чисел - наименьшие), distinct_count - их точное число. Для колонок со
+    значениями несравнимых типов minimum и maximum не определены.
+    """
+
+    def __init__(self, minimum, maximum, null_count, distinct, distinct_count, comparable=True):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.null_count = null_count
+        self.distinct = distinct
+        self.distinct_count = distinct_count
+        self.comparable = comparable
+
+    @classmethod
+    def compute(cls, column, rows, index=None):
+        """Статистика колонки по строкам rows; по индексу поля, если он есть"""
+        present = rows[~column.nulls[rows]]
+        null_count = len(rows) - len(present)
+        if index is not None:
+            # Значения индекса уже отсортированы и сравнимы
+            keys = index.keys_in(rows)
+            ordered = keys[~np.isnan(keys)] if keys.dtype.kind == 'f' else keys
+            minimum = ordered[0] if len(ordered) else None
+            maximum = ordered[-1] if len(ordered) else None
+            return cls(minimum.item() if isinstance(minimum, np.generic) else minimum,
+                       maximum.item() if isinstance(maximum, np.generic) else maximum,
+                       null_count, keys[:_DISTINCT_SKETCH].tolist(), len(keys))
+        values = column.values[present]
+        if not column.is_object():
+            keys = np.unique(values)
+            # NaN попадает в различные значения, но не в минимум и максимум
+            ordered = keys[~np.isnan(keys)] if keys.dtype.kind == 'f' else keys
+            minimum = ordered[0].item() if len(ordered) else None
+            maximum = ordered[-1].item() if len(ordered) else None
+            return cls(minimum, maximum, null_count, keys[:_DISTINCT_SKETCH].tolist(), len(keys))
+        keys = dict.fromkeys(values.tolist())
+        distinct = list(islice(keys, _DISTINCT_SKETCH))
+        try:
+            minimum = min(keys) if keys else None
+            maximum = max(keys) if keys else None
+        except TypeError:
+            return cls(None, None, null_count, distinct, len(keys), comparable=False)
+        return cls(minimum, maximum, null_count, distinct, len(keys))
+
+
+class _LayerStats:
+    """Экстент, число объектов и статистика полей по отфильтрованным строкам.
+
+    Экстент и число объектов считаются сразу, статистика поля - при первом
+    запросе (по атрибутивному индексу поля, если он построен); объект
+    заменяется целиком при каждой смене набора строк.
+    """
+
+    def __init__(self, dataset, rows, indexes=None):
+        self._dataset = dataset
+        self._rows = rows
+        self._indexes = indexes if indexes is not None else {}
+        self.count = len(rows)
+        self.extent = QgsRectangle()
+        if len(rows):
+            if dataset.polygons is not None:
+                # Экстент полигонов - по их охватывающим прямоугольникам
+                polygons = dataset.polygons
+                bounds = (polygons.xmin[rows], polygons.ymin[rows],
+                          polygons.xmax[rows], polygons.ymax[rows])
+            else:
+                bounds = (dataset.x[rows], dataset.y[rows]) * 2
+            finite = np.logical_and.reduce([np.isfinite(values) for values in bounds])
+            if finite.any():
+                self.extent = QgsRectangle(float(bounds[0][finite].min()), float(bounds[1][finite].min()),
+                                           float(bounds[2][finite].max()), float(bounds[3][finite].max()))
+        self._fields = {}
+        self._lock = threading.Lock()
+
+    def field(self, index):
+        """Статистика поля index или None для несуществующего поля"""
+        if index < 0 or index >= len(self._dataset.columns):
+            return None
+        with self._lock:
+            if index not in self._fields:
+                column = self._dataset.columns[index]
+                attribute_index = self._indexes.get(index)
+                if attribute_index is not None and attribute_index.column is not column:
+                    # Индекс построен по прежней версии колонки
+                    attribute_index = None
+                self._fields[index] = _FieldStats.compute(column, self._rows, attribute_index)
+            return self._fields[index]
+
+
+# 0.11 Пирамида сеток для отрисовки
+class _LazyPyramid:
+    """Пирамида сеток по строкам rows, которая строится при первом обращении.
+
+    Общая для провайдера и его источников: первый запрос отрисовки строит
+    пирамиду, остальные потоки ждут его и получают ту же пирамиду.
+    """
+
+    def __init__(self, x, y, rows, profiler):
+        self._x = x
+        self._y = y
+        self._rows = rows
+        self._profiler = profiler
+        self._pyramid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._pyramid is None:
+                with self._profiler.timed('pyramid'):
+                    self._pyramid = _GridPyramid(self._x, self._y, self._rows)
+            return self._pyramid
+
+
+class _GridPyramid:
+    """Многоуровневая сетка над точками для упрощенной отрисовки.
+
+    Уровень k - сетка с ячейкой cell * 2**k. Для каждой непустой ячейки
+    хранятся представитель (наименьший fid), число точек и суммы координат
+    для центра масс. Ключ ячейки (iy << 32) | ix, ключи уровня отсортированы,
+    поэтому окно читается одним срезом на строку ячеек: стоимость запроса
+    определяется числом ячеек на экране, а не числом точек.
+    """
+
+    def __init__(self, x, y, rows):
+        rows = rows[np.isfinite(x[rows]) & np.isfinite(y[rows])]
+        self.levels = []
+        if not len(rows):
+            return
+        xs = x[rows]
+        ys = y[rows]
+        self.xmin, self.ymin = xs.min(), ys.min()
+        span = max(xs.max() - self.xmin, ys.max() - self.ymin) or 1.0
+        # На самом мелком уровне в среднем около одной точки на ячейку
+        depth = min(_LOD_MAX_DEPTH, max(1, int(np.ceil(np.log2(len(rows)) / 2))))
+        self.cell = span / (1 << depth)
+        ix = np.minimum(((xs - self.xmin) / self.cell).astype(np.int64), (1 << depth) - 1)
+        iy = np.minimum(((ys - self.ymin) / self.cell).astype(np.int64), (1 << depth) - 1)
+        level = self._reduce((iy << 32) | ix, rows, np.ones(len(rows), dtype=np.int64), xs, ys)
+        self.levels.append(level)
+        while len(level[0]) > 1:
+            keys = level[0]
+            level = self._reduce(((keys >> 33) << 32) | ((keys & 0xFFFFFFFF) >> 1), *level[1:])
+            self.levels.append(level)
+
+    @staticmethod
+    def _reduce(keys, reps, counts, sum_x, sum_y):
+        """Объединяет ячейки с одинаковыми ключами"""
+        # Устойчивая сортировка сохраняет порядок fid внутри ячейки
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        return (keys[starts],
+                np.minimum.reduceat(reps[order], starts),
+                np.add.reduceat(counts[order], starts),
+                np.add.reduceat(sum_x[order], starts),
+                np.add.reduceat(sum_y[order], starts))
+
+    def query(self, xmin, ymin, xmax, ymax, cell_size):
+        """Ячейки, пересекающие прямоугольник, на уровне с ячейкой не больше cell_size.
+
+        Возвращает (представители, число точек, центр x, центр y),
+        упорядоченные по представителю, или None, если даже самый мелкий
+        уровень крупнее cell_size и упрощать нечего.
+        """
+        if not self.levels or not cell_size >= self.cell:
+            return None
+        depth = min(int(np.log2(cell_size / self.cell)), len(self.levels) - 1)
+        size = self.cell * (1 << depth)
+        limit = (1 << 32) - 1
+        ix0 = int(min(max(np.floor((xmin - self.xmin) / size), 0), limit))
+        ix1 = int(min(max(np.floor((xmax - self.xmin) / size), -1), limit))
+        iy0 = int(min(max(np.floor((ymin - self.ymin) / size), 0), limit))
+        iy1 = int(min(max(np.floor((ymax - self.ymin) / size), -1), limit))
+        keys, reps, counts, sum_x, sum_y = self.levels[depth]
+        # Строки ячеек вне данных не просматриваем
+        if len(keys):
+            iy0 = max(iy0, int(keys[0] >> 32))
+            iy1 = min(iy1, int(keys[-1] >> 32))
+        parts = []
+        for iy in range(iy0, iy1 + 1 if ix1 >= ix0 else iy0):
+            first = np.searchsorted(keys, (iy << 32) | ix0)
+            last = np.searchsorted(keys, (iy << 32) | ix1, side='right')
+            if last > first:
+                parts.append(np.arange(first, last))
+        cells = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        cells = cells[np.argsort(reps[cells], kind='stable')]
+        return (reps[cells], counts[cells],
+                sum_x[cells] / counts[cells], sum_y[cells] / counts[cells])
+
+
+# 0.12 Журнал правок
+class _EditJournal:
+    """Журнал правок <файл>.mvjournal рядом с исходным.
+
+    Первая строка - размер и хэш части файла, к которой относятся правки;
+    дальше по строке JSON на операцию. Правка дописывается в конец журнала,
+    сам файл переписывается только при сжатии. Дописанные в файл строки
+    журнал не делают устаревшим: fid прежних строк не меняются.
+    """
+    EXTENSION = '.mvjournal'
+
+    def __init__(self, source_path):
+        self.source_path = source_path
+        self.path = source_path + self.EXTENSION
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def read(self):
+        """Операции журнала; None, если журнал записан для другой версии файла"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+        except FileNotFoundError:
+            return []
+        try:
+            base = json.loads(lines[0])
+            with open(self.source_path, 'rb') as f:
+                if (os.fstat(f.fileno()).st_size < base['size'] or
+                        _prefix_digest(f, base['size']) != base['hash']):
+                    return None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        operations = []
+        for line in lines[1:]:
+            try:
+                operations.append(json.loads(line))
+            except ValueError:
+                # Пустая или недописанная (запись прервалась) строка
+                continue
+        return operations
+
+    def append(self, operation):
+        """Дописывает операцию; журнал создается при первой правке"""
+        record = json.dumps(operation) + '\n'
+        with open(self.path, 'a', encoding='utf-8') as f:
+            if f.tell() == 0:
+                size, digest, _ = _source_state(self.source_path)
+                f.write(json.dumps({'size': size, 'hash': digest}) + '\n')
+            f.write(record)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def replay(self, entry):
+        """Применяет журнал к только что загруженной записи"""
+        operations = self.read()
+        if operations is None:
+            QgsMessageLog.logMessage(
+                f"Журнал правок {self.path} относится к другой версии файла и удален",
+                'MYVEC', Qgis.Warning)
+            self.remove()
+            return
+        for operation in operations:
+            self.apply(entry, operation)
+
+    @staticmethod
+    def apply(entry, operation):
+        """Применяет операцию к записи реестра"""
+        dataset = entry.dataset
+        entry.edits += 1
+        if operation.get('op') == 'delete':
+            fids = np.asarray(operation['fids'], dtype=np.int64)
+            entry.deleted[fids[(fids >= 0) & (fids < len(dataset))]] = True
+        elif operation.get('op') == 'change':
+            for fid, index, value in operation['values']:
+                if 0 <= fid < len(dataset) and 0 <= index < len(entry.field_specs):
+                    dataset.columns[index].set(fid, value)
+                    # Индекс поля построится заново по новым значениям
+                    entry.attribute_indexes.pop(index, None)
+        elif operation.get('op') == 'orient' and dataset.polygons is not None:
+            if dataset.polygons.orient(operation.get('exterior') != 'cw'):
+                dataset.update_polygon_fields()
+                for index in range(len(entry.field_specs), len(dataset.columns)):
+                    entry.attribute_indexes.pop(index, None)
+
+
+def _edit_value(value, vtype):
+    """Значение из правки QGIS в том виде, в котором оно хранится в колонке"""
+    if _is_null_literal(value):
+        return None
+    if isinstance(value, (QDate, QDateTime)):
+        return value.toString(Qt.ISODate) if value.isValid() else None
+    if isinstance(value, str):
+        return CustomVectorDataProvider._convert_value(value, vtype, False)
+    return value
+
+
+def _format_value(value):
+    """Значение атрибута в записи DATA"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _write_compacted(path, field_specs, dataset, rows, feedback):
+    """Записывает строки rows набора в файл формата myvec"""
+    with open(path, 'w', newline='\n') as f:
+        f.write('HEADER:' + ','.join(f'{name}:{type_name}' for name, type_name in field_specs) + '\n')
+        for start in range(0, len(rows), _CHUNK_ROWS):
+            feedback.check_canceled()
+            feedback.set_progress(start / len(rows))
+            chunk = rows[start:start + _CHUNK_ROWS]
+            if dataset.polygons is not None:
+                prefix = 'POLY:'
+                parts = [dataset.polygons.take(chunk).to_text()]
+            else:
+                prefix = 'DATA:'
+                parts = [map(repr, dataset.x[chunk].tolist()), map(repr, dataset.y[chunk].tolist())]
+            # Вычисляемые поля полигонов в файл не пишутся
+            parts += [map(_format_value, column.take(chunk).as_objects().tolist())
+                      for column in dataset.columns[:len(field_specs)]]
+            f.writelines(prefix + ','.join(values) + '\n' for values in zip(*parts))
+
+
+def _lossy_lines(path, field_count, polygon_file, loaded, feedback):
+    """Число строк файла, которые при перезаписи из набора были бы потеряны.
+
+    Это строки, пропущенные при разборе (не записи данных, некорректные
+    координаты или кольца), и записи с лишними значениями после полей
+    заголовка. Пустые строки данных не несут и не считаются.
+    """
+    prefix = b'POLY:' if polygon_file else b'DATA:'
+    # Кольца полигона - одно значение записи, у точки две координаты
+    width = field_count + (1 if polygon_file else 2)
+    size = max(os.path.getsize(path), 1)
+    records = lossy = 0
+    with open(path, 'rb') as f:
+        # Первая строка - заголовок
+        f.readline()
+        tail = b''
+        while True:
+            feedback.check_canceled()
+            block = f.read(_BLOCK_CHARS)
+            if not block:
+                break
+            feedback.set_progress(f.tell() / size)
+            lines = (tail + block).split(b'\n')
+            tail = lines.pop()
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                if not line.startswith(prefix):
+                    lossy += 1
+                    continue
+                records += 1
+                if line.count(b',') >= width:
+                    lossy += 1
+        tail = tail.strip()
+        if tail:
+            if not tail.startswith(prefix):
+                lossy += 1
+            else:
+                records += 1
+                lossy += tail.count(b',') >= width
+    # Записи, которых нет в наборе, отброшены разбором
+    return lossy + max(records - loaded, 0)
+
+
+class _CompactTask(QgsTask):
+    """Сжатие журнала: файл переписывается без удаленных строк и с правками"""
+
+    def __init__(self, provider):
+        super().__init__(f"Сжатие {os.path.basename(provider.file_path)}", QgsTask.CanCancel)
+        self.provider = provider
+        self.path = provider.file_path + '.compact'
+        self.field_specs = provider._field_specs
+        self.dataset = provider._dataset
+        self.rows = np.flatnonzero(~provider._entry.deleted)
+        # Правки и дописанные строки после начала сжатия не попали бы в файл
+        self.journal_size = provider._journal.size()
+        self.signature = _file_signature(provider.file_path)
+        self.source = provider.file_path
+        self.polygon_file = provider.polygon_file
+        self.error = None
+
+    def run(self):
+        try:
+            feedback = _LoadFeedback(self)
+            # Набор хранит только разобранные строки: если разбор что-то
+            # пропустил, перезапись файла из набора потеряла бы эти строки
+            lossy = _lossy_lines(self.source, len(self.field_specs), self.polygon_file,
+                                 len(self.dataset), feedback)
+            if lossy:
+                self.error = (f"Сжатие журнала отменено: {lossy} строк файла не загружены в слой "
+                              "полностью (не записи данных, некорректные координаты или лишние "
+                              "значения) и были бы потеряны при перезаписи")
+                return False
+            _write_compacted(self.path, self.field_specs, self.dataset, self.rows, feedback)
+            return True
+        except _LoadCanceled:
+            self.error = "Сжатие журнала отменено"
+        except OSError as e:
+            self.error = f"Не удалось сжать журнал правок: {str(e)}"
+        return False
+
+    def finished(self, result):
+        if not result and self.error is None:
+            self.error = "Сжатие журнала отменено"
+        if sip.isdeleted(self.provider):
+            self.error = "Слой удален"
+            self.discard()
+            return
+        self.provider._finish_compaction(self)
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+# 0.13 Профилирование
+class _Profiler:
+    """Время операций и счетчики провайдера (URI profile=true или MYVEC_PROFILE=1).
+
+    Итераторы копят счетчики у себя и передают их при исчерпании или
+    закрытии, поэтому на каждый выданный объект не приходится ни одного
+    вызова профилировщика.
+    """
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Имя операции -> (вызовов, суммарное время, наибольшее время)
+        self._timings = {}
+        self._counters = {}
+
+    @contextmanager
+    def timed(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        with self._lock:
+            calls, total, longest = self._timings.get(name, (0, 0.0, 0.0))
+            self._timings[name] = (calls + 1, total + seconds, max(longest, seconds))
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        """{'timings': {операция: {calls, total_s, max_s}}, 'counters': {счетчик: значение}}"""
+        with self._lock:
+            return {
+                'timings': {name: {'calls': calls, 'total_s': total, 'max_s': longest}
+                            for name, (calls, total, longest) in self._timings.items()},
+                'counters': dict(self._counters),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+    def summary(self):
+        """Сводка в текстовом виде для журнала сообщений"""
+        snapshot = self.snapshot()
+        lines = [f"{name}: {t['calls']} раз, всего {t['total_s'] * 1000:.1f} мс, "
+                 f"максимум {t['max_s'] * 1000:.1f} мс"
+                 for name, t in sorted(snapshot['timings'].items())]
+        lines += [f"{name}: {value}" for name, value in sorted(snapshot['counters'].items())]
+        return '\n'.join(lines)
+
+
+class _NullProfiler:
+    """Профилирование выключено: вызовы ничего не делают"""
+    enabled = False
+    _NO_TIMING = nullcontext()
+
+    def timed(self, name):
+        return self._NO_TIMING
+
+    def record(self, name, seconds):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+    def snapshot(self):
+        return {'timings': {}, 'counters': {}}
+
+    def reset(self):
+        pass
+
+    def summary(self):
+        return ''
+
+
+_NULL_PROFILER = _NullProfiler()
+
+
+# 0.14 Полигоны
+def _is_polygon_file(path):
+    """Полигональный ли файл: первая запись после заголовка - POLY, а не DATA"""
+    with open(path, 'rb') as f:
+        f.readline()
+        for line in islice(f, 1000):
+            if line.startswith(b'POLY:'):
+                return True
+            if line.startswith(b'DATA:'):
+                return False
+    return False
+
+
+def _polygon_fields(fields):
+    """Поля файла и вычисляемые поля полигонов"""
+    fields = QgsFields(fields)
+    for name, vtype in _POLYGON_FIELDS:
+        fields.append(QgsField(name, vtype))
+    return fields
+
+
+def _ranges(starts, ends):
+    """Индексы диапазонов starts[i]:ends[i], записанные подряд"""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    shifts = starts - np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    return np.arange(total, dtype=np.int64) + np.repeat(shifts, lengths)
+
+
+class _PolygonStore:
+    """Полигоны набора в плоских массивах.
+
+    Запись POLY: кольца через '|', вершины через ';', координаты через
+    пробел; первое кольцо внешнее. Вершины всех колец хранятся подряд в x
+    и y без замыкающей вершины: кольцо k занимает вершины
+    ring_offsets[k]:ring_offsets[k + 1], строка row - кольца
+    row_rings[row]:row_rings[row + 1]. Площади и ориентация всех колец
+    считаются одним проходом по массивам.
+    """
+
+    def __init__(self, x, y, ring_offsets, row_rings):
+        self.x = x
+        self.y = y
+        self.ring_offsets = ring_offsets
+        self.row_rings = row_rings
+        # Охватывающие прямоугольники строк
+        starts = ring_offsets[row_rings[:-1]]
+        if len(starts):
+            self.xmin = np.minimum.reduceat(x, starts)
+            self.ymin = np.minimum.reduceat(y, starts)
+            self.xmax = np.maximum.reduceat(x, starts)
+            self.ymax = np.maximum.reduceat(y, starts)
+        else:
+            self.xmin = self.ymin = self.xmax = self.ymax = np.empty(0, dtype=np.float64)
+        # Индекс строится по центрам прямоугольников: окно поиска расширяется
+        # на наибольшие полуширину и полувысоту (с запасом на округление)
+        half_w = (self.xmax - self.xmin) / 2
+        half_h = (self.ymax - self.ymin) / 2
+        self.reach = (float(np.nanmax(half_w)) * (1 + 1e-9) if len(starts) else 0.0,
+                      float(np.nanmax(half_h)) * (1 + 1e-9) if len(starts) else 0.0)
+
+    def __len__(self):
+        return len(self.row_rings) - 1
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64),
+                   np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64))
+
+    @classmethod
+    def parse(cls, texts):
+        """Разбирает записи колец; возвращает полигоны и маску разобранных записей"""
+        try:
+            return cls._parse_texts(texts), np.ones(len(texts), dtype=bool)
+        except ValueError:
+            pass
+        # Есть некорректные записи: разбираем поштучно и пропускаем их
+        valid = np.zeros(len(texts), dtype=bool)
+        parts = []
+        for i, text in enumerate(texts):
+            try:
+                parts.append(cls._parse_texts([text]))
+                valid[i] = True
+            except ValueError:
+                pass
+        return cls.concat(parts), valid
+
+    @classmethod
+    def _parse_texts(cls, texts):
+        if not texts:
+            return cls.empty()
+        rings = '|'.join(texts).split('|')
+        ring_counts = np.array([text.count('|') + 1 for text in texts], dtype=np.int64)
+        vertex_counts = np.array([ring.count(';') + 1 for ring in rings], dtype=np.int64)
+        tokens = ' '.join(rings).replace(';', ' ').split()
+        if len(tokens) != 2 * vertex_counts.sum():
+            raise ValueError("число координат не совпадает с числом вершин")
+        coords = np.array(tokens).astype(np.float64)
+        x = coords[0::2]
+        y = coords[1::2]
+        # Замыкающая вершина, совпадающая с первой, не хранится
+        ends = np.cumsum(vertex_counts)
+        starts = ends - vertex_counts
+        closed = (vertex_counts > 1) & (x[starts] == x[ends - 1]) & (y[starts] == y[ends - 1])
+        if closed.any():
+            keep = np.ones(len(x), dtype=bool)
+            keep[ends[closed] - 1] = False
+            x = x[keep]
+            y = y[keep]
+            vertex_counts = vertex_counts - closed
+        if (vertex_counts < 3).any():
+            raise ValueError("в кольце меньше трех вершин")
+        return cls(x, y, np.concatenate([[0], np.cumsum(vertex_counts)]),
+                   np.concatenate([[0], np.cumsum(ring_counts)]))
+
+    @classmethod
+    def concat(cls, stores):
+        stores = [store for store in stores if len(store)]
+        if not stores:
+            return cls.empty()
+        if len(stores) == 1:
+            return stores[0]
+        vertex_base = np.cumsum([0] + [len(store.x) for store in stores[:-1]])
+        ring_base = np.cumsum([0] + [store.row_rings[-1] for store in stores[:-1]])
+        return cls(np.concatenate([store.x for store in stores]),
+                   np.concatenate([store.y for store in stores]),
+                   np.concatenate([[0]] + [store.ring_offsets[1:] + base
+                                           for store, base in zip(stores, vertex_base)]),
+                   np.concatenate([[0]] + [store.row_rings[1:] + base
+                                           for store, base in zip(stores, ring_base)]))
+
+    def take(self, rows):
+        """Полигоны выбранных строк"""
+        rings = _ranges(self.row_rings[rows], self.row_rings[rows + 1])
+        vertices = _ranges(self.ring_offsets[rings], self.ring_offsets[rings + 1])
+        return _PolygonStore(
+            self.x[vertices], self.y[vertices],
+            np.concatenate([[0], np.cumsum(np.diff(self.ring_offsets)[rings])]),
+            np.concatenate([[0], np.cumsum(np.diff(self.row_rings)[rows])]))
+
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.x, self.y, self.ring_offsets, self.row_rings,
+                                              self.xmin, self.ymin, self.xmax, self.ymax))
+
+    def rings(self, row):
+        """Кольца строки списками QgsPointXY (замкнутыми)"""
+        rings = []
+        for ring in range(self.row_rings[row], self.row_rings[row + 1]):
+            start, end = self.ring_offsets[ring], self.ring_offsets[ring + 1]
+            points = [QgsPointXY(x, y) for x, y in zip(self.x[start:end].tolist(),
+                                                       self.y[start:end].tolist())]
+            rings.append(points + points[:1])
+        return rings
+
+    def to_text(self):
+        """Записи колец строк в формате POLY"""
+        vertices = [f'{x!r} {y!r}' for x, y in zip(self.x.tolist(), self.y.tolist())]
+        offsets = self.ring_offsets.tolist()
+        rings = [';'.join(vertices[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+        row_rings = self.row_rings.tolist()
+        return ['|'.join(rings[start:end]) for start, end in zip(row_rings[:-1], row_rings[1:])]
+
+    def signed_areas(self):
+        """Знаковые площади всех колец: больше нуля - обход против часовой стрелки"""
+        if not len(self.x):
+            return np.empty(0, dtype=np.float64)
+        starts = self.ring_offsets[:-1]
+        lengths = np.diff(self.ring_offsets)
+        # Координаты относительно первой вершины кольца: меньше потеря точности
+        x = self.x - np.repeat(self.x[starts], lengths)
+        y = self.y - np.repeat(self.y[starts], lengths)
+        following = np.arange(1, len(x) + 1)
+        following[self.ring_offsets[1:] - 1] = starts
+        return np.add.reduceat(x * y[following] - x[following] * y, starts) / 2
+
+    def measures(self):
+        """Площадь строк (внешнее кольцо без отверстий), знаковая площадь и
+        ориентация против часовой стрелки внешнего кольца"""
+        ring_areas = self.signed_areas()
+        exterior = ring_areas[self.row_rings[:-1]]
+        ring_rows = np.repeat(np.arange(len(self)), np.diff(self.row_rings))
+        total = np.bincount(ring_rows, weights=np.abs(ring_areas), minlength=len(self))
+        holes = total - np.abs(exterior)
+        return np.abs(exterior) - holes, exterior, exterior > 0
+
+    def misoriented(self, exterior_ccw=True):
+        """Маска колец с обходом не в ту сторону: внешние кольца против часовой
+        стрелки (или по ней при exterior_ccw=False), отверстия - наоборот"""
+        ring_areas = self.signed_areas()
+        exterior = np.zeros(len(ring_areas), dtype=bool)
+        exterior[self.row_rings[:-1]] = True
+        positive = exterior == exterior_ccw
+        return np.where(positive, ring_areas < 0, ring_areas > 0)
+
+    def orient(self, exterior_ccw=True):
+        """Разворачивает кольца с неверным обходом; возвращает их число"""
+        wrong = self.misoriented(exterior_ccw)
+        if wrong.any():
+            starts = self.ring_offsets[:-1]
+            lengths = np.diff(self.ring_offsets)
+            order = np.arange(len(self.x))
+            flip = np.repeat(wrong, lengths)
+            # Вершина i кольца start:start + length переходит на место
+            # start + (start + length - 1 - i)
+            mirror = np.repeat(2 * starts + lengths - 1, lengths) - order
+            order[flip] = mirror[flip]
+            self.x = self.x[order]
+            self.y = self.y[order]
+        return int(wrong.sum())
+
+    def rows_in(self, index, xmin, ymin, xmax, ymax):
+        """Строки индекса (по центрам), чьи прямоугольники пересекают окно"""
+        reach_x, reach_y = self.reach
+        rows = index.query(xmin - reach_x, ymin - reach_y, xmax + reach_x, ymax + reach_y)
+        keep = ((self.xmin[rows] <= xmax) & (self.xmax[rows] >= xmin) &
+                (self.ymin[rows] <= ymax) & (self.ymax[rows] >= ymin))
+        return np.sort(rows[keep])
+
 
 # 1. Класс провайдера данных
 class CustomVectorDataProvider(QgsVectorDataProvider):
     def __init__(self, uri, options):
         super().__init__(uri, options)
         self.uri = uri
-        self._all_features = []
-        self._filtered_features = []
+        self._dataset = MyvecDataset()
+        # Номера строк, прошедших фильтр, и маска для проверки fid за O(1)
+        self._filtered_idx = np.empty(0, dtype=np.int64)
+        self._filter_mask = np.empty(0, dtype=bool)
         self._fields = QgsFields()
+        self._field_specs = []
         self._subset_string = ""
         self._spatial_index = None
+        # Сетка для поиска по расстоянию, строится при первом запросе
+        self._point_grid = None
+        # Экстент и статистика полей по отфильтрованным строкам
+        self._stats = _LayerStats(self._dataset, self._filtered_idx)
+        # Общая запись реестра: данные и индекс по всем строкам
+        self._entry = _DatasetEntry([], self._dataset)
         self._crs = QgsCoordinateReferenceSystem("EPSG:4326")
         
-        # Парсинг параметров из URI
-        params = self.parse_uri(uri)
-        self.file_path = params.get('file', '')
-        self.cache_enabled = params.get('cache', 'false') == 'true'
-        self._subset_string = params.get('filter', '')
+        # Парсинг параметров из URI
+        params = self.parse_uri(uri)
+        self.file_path = params.get('file', '')
+        self.cache_enabled = params.get('cache', 'false') == 'true'
+        # index=file: индекс по всем строкам сохраняется в <файл>.mvidx
+        self.index_file = params.get('index', '') == 'file'
+        # Режим разбора: 'bulk' (блочный, по умолчанию) или 'lines' (построчный)
+        self.parser_mode = params.get('parser', 'bulk')
+        # Число процессов блочного разбора: 1 (по умолчанию), 'auto' (по
+        # размеру файла) или число; только в Linux, см. _parse_workers
+        self.workers = params.get('workers', '1')
+        self._subset_string = params.get('filter', '')
+        # Фоновая загрузка: слой создается сразу, данные появляются по готовности
+        self.async_load = params.get('async', 'false') == 'true'
+        # watch=true: дописанные в файл строки подхватываются без переоткрытия
+        self.watch = params.get('watch', 'false') == 'true'
+        self._watcher = None
+        self._release_entry = None
+        # lod=thin|aggregate: при мелком масштабе одна точка (или сводный
+        # объект с числом точек) на пиксель; lod_width - ширина экрана в
+        # пикселях для запросов, в которых QGIS не передает допуск упрощения
+        self.lod_mode = params.get('lod', '') if params.get('lod') in ('thin', 'aggregate') else ''
+        try:
+            self.lod_width = float(params.get('lod_width', _LOD_DEFAULT_WIDTH))
+        except ValueError:
+            self.lod_width = _LOD_DEFAULT_WIDTH
+        self._pyramid = None
+        # access=lazy: файл не загружается, строки разбираются по запросу
+        self.lazy_access = params.get('access', '') == 'lazy'
+        # sample=N: только выборка из N строк, равномерно по файлу, для
+        # предпросмотра; экстент и число объектов приближенные
+        try:
+            self.sample_rows = max(int(params.get('sample', 0)), 0)
+        except ValueError:
+            self.sample_rows = 0
+        self._estimated_count = None
+        self._lines = None
+        # Правки (удаление, изменение атрибутов) пишутся в <файл>.mvjournal
+        self._journal = _EditJournal(self.file_path)
+        self._compact_task = None
+        # profile=true (или MYVEC_PROFILE=1 в окружении): время операций и
+        # счетчики; profile_interval - период сводки в журнале сообщений, с
+        profile = params.get('profile', os.environ.get('MYVEC_PROFILE', ''))
+        self._profiler = _Profiler() if profile in ('true', '1') else _NULL_PROFILER
+        try:
+            self.profile_interval = float(params.get(
+                'profile_interval', os.environ.get('MYVEC_PROFILE_INTERVAL', 0)))
+        except ValueError:
+            self.profile_interval = 0
+        # Файл с записями POLY: полигоны с вычисляемыми площадью и ориентацией.
+        # Кэш, чтение по запросу и пирамида сеток рассчитаны на точки
+        try:
+            self.polygon_file = _is_polygon_file(self.file_path)
+        except OSError:
+            self.polygon_file = False
+        if self.polygon_file:
+            if self.lazy_access:
+                QgsMessageLog.logMessage(
+                    f"Режим access=lazy не поддерживается для полигонов, {self.file_path} загружается целиком",
+                    'MYVEC', Qgis.Warning)
+            self.cache_enabled = False
+            self.lazy_access = False
+            self.lod_mode = ''
+        self._valid = True
+        self._load_task = None
+        
+        # Загрузка данных
+        if self.sample_rows:
+            self._load_sample()
+        elif self.lazy_access:
+            self._open_lines()
+        elif self.async_load:
+            self._start_background_load()
+        else:
+            self._load_data()
+        if self.watch and self._valid and not self.sample_rows:
+            self._watch_file()
+        if self._profiler.enabled and self.profile_interval > 0:
+            self._profile_timer = QTimer(self)
+            self._profile_timer.setInterval(int(self.profile_interval * 1000))
+            self._profile_timer.timeout.connect(self._log_profile)
+            self._profile_timer.start()
+
+    def parse_uri(self, uri):
+        """Разбирает URI на параметры"""
+        params = {}
+        if '?' in uri:
+            path_part, query_part = uri.split('?', 1)
+            for param in query_part.split('&'):
+                if '=' in param:
+                    key, value = param.split('=', 1)
+                    params[key] = value
+            # Путь задается либо до '?', либо параметром file
+            path = path_part.replace('myvec://', '')
+            if path or 'file' not in params:
+                params['file'] = path
+        else:
+            params['file'] = uri.replace('myvec://', '')
+        return params
+
+    def name(self):
+        return 'my_custom_provider'
+
+    def description(self):
+        return 'Custom Vector Provider'
+
+    def isValid(self):
+        return self._valid
+
+    def _report_error(self, message):
+        """Передает ошибку в журнал ошибок провайдера и в журнал сообщений QGIS"""
+        self.appendError(QgsErrorMessage(message, self.name()))
+        QgsMessageLog.logMessage(message, 'MYVEC', Qgis.Warning)
+
+    def _load_data(self):
+        """Синхронная загрузка: данные, фильтр и индекс в текущем потоке"""
+        try:
+            entry = self._acquire_entry(_LoadFeedback())
+            filtered_idx, spatial_index = self._prepare(entry, self._subset_string)
+        except Exception as e:
+            self._report_error(f"Не удалось загрузить файл: {str(e)}")
+            self._valid = False
+            return
+        self._install(entry, filtered_idx, spatial_index)
+
+    def _load_sample(self):
+        """Загружает выборку строк (sample=N) в обход общего реестра"""
+        try:
+            field_specs, dataset, self._estimated_count = self._sample_file(
+                self.file_path, self.sample_rows)
+        except Exception as e:
+            self._report_error(f"Не удалось загрузить файл: {str(e)}")
+            self._valid = False
+            return
+        # fid объектов выборки - номера строк выборки, а не файла
+        entry = _DatasetEntry(field_specs, dataset)
+        entry.refs = 1
+        self._install(entry, *self._prepare(entry, self._subset_string))
+
+    def _open_lines(self):
+        """Открывает индекс строк файла (режим access=lazy), при необходимости строит его"""
+        try:
+            lines = _LineIndex.load(self.file_path)
+            if lines is None:
+                with open(self.file_path, 'r') as f:
+                    _, field_specs = self._read_header(f)
+                offsets, x, y = self._scan_lines(self.file_path, _LoadFeedback())
+                lines = _LineIndex.build(self.file_path, field_specs, offsets, x, y)
+                lines.save()
+        except Exception as e:
+            self._report_error(f"Не удалось загрузить файл: {str(e)}")
+            self._valid = False
+            return
+        if self._journal.exists():
+            QgsMessageLog.logMessage(
+                f"Правки из {self._journal.path} не применяются в режиме access=lazy",
+                'MYVEC', Qgis.Warning)
+        self._lines = lines
+        self._field_specs = lines.field_specs
+        self._fields = _make_fields(lines.field_specs)
+        self._dataset = MyvecDataset(self._fields)
+        self._entry = _DatasetEntry(self._field_specs, self._dataset)
+
+    def _start_background_load(self):
+        """Запускает загрузку в диспетчере задач QGIS.
+
+        Поля читаются из HEADER сразу, чтобы слой был валиден с первого
+        момента; объекты появляются, когда задача завершится.
+        """
+        try:
+            with open(self.file_path, 'r') as f:
+                self._fields, self._field_specs = self._read_header(f)
+        except OSError as e:
+            self._report_error(f"Не удалось загрузить файл: {str(e)}")
+            self._valid = False
+            return
+        if self.polygon_file:
+            self._fields = _polygon_fields(self._fields)
+        self._dataset = MyvecDataset(self._fields)
+        self._entry = _DatasetEntry(self._field_specs, self._dataset)
+        # До окончания загрузки слой пуст, но запросы (отрисовка начинается
+        # сразу) работают как обычно: пустые строки, индекс и статистика
+        self._set_filtered(np.empty(0, dtype=np.int64))
+        self._spatial_index = _PackedPointIndex.build(self._dataset.x, self._dataset.y, self._filtered_idx)
+        self._load_task = _LoadTask(self)
+        QgsApplication.taskManager().addTask(self._load_task)
+
+    def isLoading(self):
+        """Идет ли фоновая загрузка"""
+        return self._load_task is not None
+
+    def loadTask(self):
+        """Задача фоновой загрузки (для отслеживания прогресса) или None"""
+        return self._load_task
+
+    def cancelLoading(self):
+        """Отменяет фоновую загрузку"""
+        if self._load_task is not None:
+            self._load_task.cancel()
+
+    def _finish_background_load(self, task):
+        """Вызывается в основном потоке по завершении задачи загрузки"""
+        self._load_task = None
+        if task.error is not None:
+            self._report_error(task.error)
+            self._valid = False
+            return
+        filtered_idx, spatial_index = task.filtered_idx, task.spatial_index
+        if task.subset_string != self._subset_string or task.entry.edits != task.edits:
+            # Фильтр сменили или файл правили в другом слое во время загрузки
+            filtered_idx, spatial_index = self._prepare(task.entry, self._subset_string)
+        self._install(task.entry, filtered_idx, spatial_index)
+        self.dataChanged.emit()
+        self.fullExtentCalculated.emit()
+
+    def _acquire_entry(self, feedback):
+        """Получает разобранный файл из общего реестра или загружает его"""
+        return _DATASET_REGISTRY.acquire(self.file_path, lambda: self._read_dataset(feedback))
+
+    def _prepare(self, entry, subset_string, context=None):
+        """Вычисляет отфильтрованные строки и пространственный индекс для записи"""
+        filtered_idx = self._select_rows(entry, subset_string, context=context)
+        return filtered_idx, self._index_for(entry, filtered_idx)
+
+    def _install(self, entry, filtered_idx, spatial_index):
+        """Подключает загруженные данные к провайдеру"""
+        self._entry.providers.discard(self)
+        entry.providers.add(self)
+        self._entry = entry
+        self._dataset = entry.dataset
+        self._fields = entry.dataset.fields
+        self._field_specs = entry.field_specs
+        self._set_filtered(filtered_idx)
+        self._spatial_index = spatial_index
+        # Предыдущая запись (до перечитывания файла) больше не используется
+        if self._release_entry is not None:
+            self._release_entry()
+        self._release_entry = weakref.finalize(self, _DATASET_REGISTRY.release, entry)
+
+    def _read_dataset(self, feedback):
+        """Загружает данные из кэша, если он включен и актуален, иначе из файла"""
+        state = _source_state(self.file_path)
+        cache = _SidecarCache(self.file_path) if self.cache_enabled else None
+        loaded = None
+        if cache is not None:
+            with self._profiler.timed('cache'):
+                loaded = cache.load()
+        if loaded is not None:
+            entry = _DatasetEntry(*loaded)
+            entry.source_state = state
+        else:
+            entry = self._parse_dataset(state, cache, feedback)
+        # Кэш и индекс хранят файл как есть, правки применяются поверх
+        self._journal.replay(entry)
+        return entry
+
+    def _parse_dataset(self, state, cache, feedback):
+        """Разбирает файл; сохраняет кэш или файл индекса, если они включены"""
+        with self._profiler.timed('parse'):
+            field_specs, dataset = self._parse_file(self.file_path, feedback)
+        entry = _DatasetEntry(field_specs, dataset)
+        if os.path.getsize(self.file_path) == state[0]:
+            entry.source_state = state
+        if cache is not None and len(dataset):
+            entry.full_index = _PackedPointIndex.build(dataset.x, dataset.y, np.arange(len(dataset)))
+            cache.save(field_specs, dataset, entry.full_index)
+        elif self.index_file and len(dataset):
+            index_file = _IndexFile(self.file_path)
+            entry.full_index = index_file.load(dataset)
+            if entry.full_index is None:
+                entry.full_index = _PackedPointIndex.build(dataset.x, dataset.y, np.arange(len(dataset)))
+                index_file.save(dataset, entry.full_index)
+        return entry
+
+    def _read_appended(self, previous, feedback):
+        """Запись для файла, к которому дописали строки.
+
+        Разбирается только хвост после разобранной части; если изменились
+        заголовок или уже разобранные байты (или файл стал короче), файл
+        загружается заново.
+        """
+        state = previous.source_state
+        if state is None or not state[2] or previous.dataset.polygons is not None:
+            # Полигональный набор после дописывания загружается заново
+            return self._read_dataset(feedback)
+        size, digest, _ = state
+        with open(self.file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < size or _prefix_digest(f, size) != digest:
+                return self._read_dataset(feedback)
+            f.seek(size)
+            tail = f.read()
+        # Незавершенная последняя строка останется до следующего изменения
+        tail = tail[:tail.rfind(b'\n') + 1]
+        
+        old = previous.dataset
+        field_types = [old.fields[i].type() for i in range(len(old.fields))]
+        xs, ys = [old.x], [old.y]
+        chunks = [[column] for column in old.columns]
+        self._parse_block(tail.decode('utf-8').split('\n'), field_types, xs, ys, chunks)
+        dataset = old
+        if len(xs) > 1:
+            dataset = MyvecDataset(old.fields, np.concatenate(xs), np.concatenate(ys),
+                                   [_Column.concat(vtype, column_chunks)
+                                    for vtype, column_chunks in zip(field_types, chunks)])
         
-        # Загрузка данных
-        self._parse_file(self.file_path)
-        self.apply_filter()
-        self._build_spatial_index()
+        entry = _DatasetEntry(previous.field_specs, dataset)
+        entry.deleted[:len(old)] = previous.deleted
+        entry.source_state = _source_state(self.file_path, size + len(tail))
+        entry.extends = state
+        if previous.full_index is not None and len(dataset) > len(old):
+            indexes = (previous.full_index.indexes if isinstance(previous.full_index, _IndexChain)
+                       else [previous.full_index])
+            appended = _PackedPointIndex.build(dataset.x, dataset.y, np.arange(len(old), len(dataset)))
+            entry.full_index = _IndexChain(indexes + [appended])
+            if entry.full_index.appended_rows() > _APPEND_REBUILD_FRACTION * len(indexes[0]):
+                entry.full_index = None
+        elif len(dataset) == len(old):
+            entry.full_index = previous.full_index
+        return entry
 
-    def parse_uri(self, uri):
-        """Разбирает URI на параметры"""
-        params = {}
-        if '?' in uri:
-            path_part, query_part = uri.split('?', 1)
-            for param in query_part.split('&'):
-                if '=' in param:
-                    key, value = param.split('=', 1)
-                    params[key] = value
-            params['file'] = path_part.replace('myvec://', '')
-        else:
-            params['file'] = uri.replace('myvec://', '')
-        return params
+    def _watch_file(self):
+        """Следит за файлом; изменения обрабатываются после паузы в записи"""
+        self._reload_timer = QTimer(self)
+        self._reload_timer.setSingleShot(True)
+        self._reload_timer.setInterval(_RELOAD_DELAY_MS)
+        self._reload_timer.timeout.connect(self._reload_changed)
+        self._watcher = QFileSystemWatcher([self.file_path], self)
+        self._watcher.fileChanged.connect(lambda path: self._reload_timer.start())
 
-    def _parse_file(self, file_path):
-        """Парсинг пользовательского формата файла"""
-        self._fields = QgsFields()
-        self._all_features = []
+    def _reload_changed(self):
+        """Подхватывает изменения файла: дописанные строки или новую версию целиком"""
+        if self._load_task is not None or not os.path.exists(self.file_path):
+            # Загрузка еще идет или файл заменяется; дождемся следующего сигнала
+            return
+        if self.file_path not in self._watcher.files():
+            # Файл, замененный переименованием, перестает отслеживаться
+            self._watcher.addPath(self.file_path)
         
+        if self._lines is not None:
+            self._open_lines()
+            self.dataChanged.emit()
+            return
+        
+        previous = self._entry
         try:
-            # Пример структуры файла:
-            # HEADER:field1:type1,field2:type2
-            # DATA:x1,y1,value1,value2
+            entry = _DATASET_REGISTRY.acquire(
+                self.file_path, lambda: self._read_appended(previous, _LoadFeedback()))
+        except Exception as e:
+            self._report_error(f"Не удалось перечитать файл: {str(e)}")
+            return
+        if entry is previous:
+            _DATASET_REGISTRY.release(entry)
+            return
+        
+        if entry.extends is not None and entry.extends == previous.source_state:
+            # Старые строки не изменились: фильтр проверяется только для новых
+            appended = np.arange(len(previous.dataset), len(entry.dataset), dtype=np.int64)
+            filtered_idx = np.concatenate([
+                self._filtered_idx, self._select_rows(entry, self._subset_string, appended)])
+            spatial_index = self._index_for(entry, filtered_idx)
+        else:
+            filtered_idx, spatial_index = self._prepare(entry, self._subset_string)
+        self._install(entry, filtered_idx, spatial_index)
+        self.dataChanged.emit()
+        self.fullExtentCalculated.emit()
+
+    def _read_header(self, f):
+        """Читает первую строку файла; возвращает поля и их описание (имя, тип)"""
+        fields = QgsFields()
+        field_specs = []
+        header_line = f.readline().strip()
+        if header_line.startswith('HEADER:'):
+            header = header_line.split(':', 1)[1]
+            for field_def in header.split(','):
+                if ':' in field_def:
+                    name, ftype = field_def.split(':', 1)
+                    fields.append(QgsField(name, self._map_type(ftype)))
+                    field_specs.append((name, _TYPE_NAMES[self._map_type(ftype)]))
+        return fields, field_specs
+
+    def _parse_file(self, file_path, feedback):
+        """Парсинг пользовательского формата файла; возвращает (описание полей, данные)"""
+        # Пример структуры файла:
+        # HEADER:field1:type1,field2:type2
+        # DATA:x1,y1,value1,value2
+        
+        size = max(os.path.getsize(file_path), 1)
+        with open(file_path, 'r') as f:
+            # Чтение заголовка
+            fields, field_specs = self._read_header(f)
+            field_types = [fields[i].type() for i in range(len(fields))]
             
-            with open(file_path, 'r') as f:
-                # Чтение заголовка
-                header_line = f.readline().strip()
-                if header_line.startswith('HEADER:'):
-                    header = header_line.split(':', 1)[1]
-                    for field_def in header.split(','):
-                        if ':' in field_def:
-                            name, ftype = field_def.split(':', 1)
-                            self._fields.append(QgsField(name, self._map_type(ftype)))
+            # Чтение данных
+            workers = self._parse_workers(size)
+            if self.polygon_file:
+                # Построчного и параллельного разбора для полигонов нет
+                polygons = []
+                _, _, columns = self._parse_data_bulk(f, field_types, size, feedback, polygons)
+                return field_specs, MyvecDataset.from_polygons(
+                    fields, columns, _PolygonStore.concat(polygons))
+            if self.parser_mode == 'lines':
+                x, y, columns = self._parse_data_lines(f, field_types, size, feedback)
+            elif workers > 1:
+                x, y, columns = self._parse_data_parallel(file_path, field_types, workers, feedback)
+            else:
+                x, y, columns = self._parse_data_bulk(f, field_types, size, feedback)
+        return field_specs, MyvecDataset(fields, x, y, columns)
+
+    def _scan_lines(self, file_path, feedback):
+        """Смещения и координаты строк DATA без разбора атрибутов.
+
+        Строки отбираются по тем же правилам, что и при полном разборе,
+        поэтому fid совпадают с номерами строк загруженного набора.
+        """
+        size = max(os.path.getsize(file_path), 1)
+        offsets, xs, ys = [], [], []
+        with open(file_path, 'rb') as f:
+            # Первая строка - заголовок
+            f.readline()
+            position = f.tell()
+            tail = b''
+            while True:
+                feedback.check_canceled()
+                block = f.read(_BLOCK_CHARS)
+                if not block:
+                    break
+                feedback.set_progress(position / size)
+                lines = (tail + block).split(b'\n')
+                tail = lines.pop()
+                position = self._scan_block(lines, position, offsets, xs, ys)
+            if tail:
+                self._scan_block([tail], position, offsets, xs, ys)
+        
+        if not offsets:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+        return np.concatenate(offsets), np.concatenate(xs), np.concatenate(ys)
+
+    def _sample_file(self, file_path, rows):
+        """Выборка не более rows записей DATA (или POLY), равномерная по файлу.
+
+        Большой файл не читается целиком: в rows равноотстоящих точках
+        берется первая строка, которая начинается после точки (см.
+        _sample_line). Число строк оценивается по средней длине
+        строки выборки. Возвращает (описание полей, данные, оценку числа
+        объектов).
+        """
+        with open(file_path, 'r') as f:
+            fields, field_specs = self._read_header(f)
+        field_types = [fields[i].type() for i in range(len(fields))]
+        xs, ys = [], []
+        chunks = [[] for _ in field_types]
+        polygons = [] if self.polygon_file else None
+        with open(file_path, 'rb') as f:
+            f.readline()
+            start = f.tell()
+            total = os.fstat(f.fileno()).st_size - start
+            if total <= rows * _SAMPLE_WINDOW:
+                # Небольшой файл дешевле прочитать целиком
+                lines = f.read().decode('utf-8', errors='replace').split('\n')
+                lengths = None
+            else:
+                lines = []
+                step = total / rows
+                line_start = start
+                for i in range(rows):
+                    position = start + int(i * step)
+                    if i and position < line_start:
+                        # Точка внутри строки, предшествующей уже взятой
+                        # (строки длиннее шага): взяли бы ту же строку
+                        continue
+                    # Точка выборки обычно попадает в середину строки
+                    found = self._sample_line(f, position, partial=bool(i))
+                    if found is not None:
+                        line_start, line = found
+                        lines.append(line)
+                lengths = np.array([len(line) + 1 for line in lines], dtype=np.float64)
+                lines = [line.decode('utf-8', errors='replace') for line in lines]
+        self._parse_lines(lines, field_types, xs, ys, chunks, polygons)
+        
+        columns = [_Column.concat(vtype, column_chunks)
+                   for vtype, column_chunks in zip(field_types, chunks)]
+        if polygons is not None:
+            dataset = MyvecDataset.from_polygons(fields, columns, _PolygonStore.concat(polygons))
+        else:
+            dataset = MyvecDataset(fields,
+                                   np.concatenate(xs) if xs else np.empty(0, dtype=np.float64),
+                                   np.concatenate(ys) if ys else np.empty(0, dtype=np.float64),
+                                   columns)
+        if lengths is None:
+            estimate = len(dataset)
+            if len(dataset) > rows:
+                # Прореживание с постоянным шагом сохраняет порядок строк в файле
+                dataset = dataset.take(np.linspace(0, len(dataset) - 1, rows).astype(np.int64))
+        else:
+            # Доля строк выборки, оказавшихся корректными записями
+            valid = len(dataset) / len(lines) if lines else 0.0
+            estimate = int(round(total / lengths.mean() * valid)) if len(lengths) else 0
+        return field_specs, dataset, estimate
+
+    @staticmethod
+    def _sample_line(f, position, partial):
+        """Первая строка, начинающаяся в position (при partial - после
+        первого перевода строки от position): (смещение, байты) или None.
+
+        Читается по _SAMPLE_WINDOW байт с удвоением, пока строка не
+        закончится; строки длиннее _SAMPLE_MAX_LINE и незавершенная
+        последняя строка файла пропускаются.
+        """
+        f.seek(position)
+        window = b''
+        size = _SAMPLE_WINDOW
+        while len(window) <= _SAMPLE_MAX_LINE:
+            block = f.read(size)
+            if not block:
+                return None
+            window += block
+            first = window.find(b'\n') + 1 if partial else 0
+            if first or not partial:
+                end = window.find(b'\n', first)
+                if end >= 0:
+                    return position + first, window[first:end]
+            size = len(window)
+        return None
+
+    def _scan_block(self, lines, position, offsets, xs, ys):
+        """Добавляет смещения и координаты строк DATA; возвращает позицию после блока"""
+        starts = []
+        rows = []
+        for line in lines:
+            if line.startswith(b'DATA:'):
+                row = line.decode('utf-8').strip()[5:].split(',', 2)
+                if len(row) >= 2:
+                    starts.append(position)
+                    rows.append(row[:2])
+            position += len(line) + 1
+        if rows:
+            table = np.empty((len(rows), 2), dtype=object)
+            table[:] = rows
+            x, x_ok = self._bulk_coordinates(table[:, 0])
+            y, y_ok = self._bulk_coordinates(table[:, 1])
+            valid = x_ok & y_ok
+            offsets.append(np.array(starts, dtype=np.int64)[valid])
+            xs.append(x[valid])
+            ys.append(y[valid])
+        return position
+
+    def _read_rows(self, lines, fids):
+        """Разбирает строки с указанными fid в набор данных (строка i - fids[i])"""
+        field_types = [self._fields[i].type() for i in range(len(self._fields))]
+        xs, ys = [], []
+        chunks = [[] for _ in field_types]
+        self._parse_block(lines.lines(fids), field_types, xs, ys, chunks)
+        if not xs:
+            return MyvecDataset(self._fields)
+        return MyvecDataset(self._fields, xs[0], ys[0],
+                            [_Column.concat(vtype, column_chunks)
+                             for vtype, column_chunks in zip(field_types, chunks)])
+
+    def _parse_workers(self, size):
+        """Число процессов для разбора файла размера size.
+
+        Обработчики создаются через fork: при spawn им пришлось бы заново
+        импортировать QGIS. Fork многопоточного процесса QGIS допустим только
+        в Linux (в macOS он ломает Cocoa и Qt, в Windows его нет), и даже там
+        это риск, поэтому параллельный разбор включается явно (workers=).
+        """
+        if not sys.platform.startswith('linux'):
+            return 1
+        if self.workers == 'auto':
+            return (os.cpu_count() or 1) if size >= _PARALLEL_MIN_BYTES else 1
+        try:
+            return max(1, int(self.workers))
+        except ValueError:
+            return 1
+
+    def _parse_data_parallel(self, file_path, field_types, workers, feedback):
+        """Разбор секции DATA в нескольких процессах.
+
+        Секция делится на диапазоны байт по границам строк; диапазоны
+        разбираются независимо, а их колонки склеиваются в порядке
+        диапазонов, поэтому fid совпадают с последовательным разбором.
+        """
+        with open(file_path, 'rb') as f:
+            f.readline()
+            start = f.tell()
+            end = os.fstat(f.fileno()).st_size
+            # Несколько диапазонов на процесс выравнивают нагрузку и дают прогресс
+            count = max(1, min(workers * 4, (end - start) // _PARALLEL_MIN_RANGE))
+            bounds = [start]
+            for i in range(1, count):
+                # Граница сдвигается на начало следующей строки
+                f.seek(max(start + (end - start) * i // count - 1, bounds[-1]))
+                f.readline()
+                bounds.append(min(max(f.tell(), bounds[-1]), end))
+            bounds.append(end)
+        ranges = [(file_path, a, b, field_types) for a, b in zip(bounds, bounds[1:]) if b > a]
+        
+        xs, ys = [], []
+        chunks = [[] for _ in field_types]
+        context = multiprocessing.get_context('fork')
+        with context.Pool(min(workers, len(ranges) or 1)) as pool:
+            for done, (x, y, columns) in enumerate(pool.imap(_parse_range, ranges), 1):
+                feedback.check_canceled()
+                feedback.set_progress(done / len(ranges))
+                xs.append(x)
+                ys.append(y)
+                for i, column in enumerate(columns):
+                    chunks[i].append(column)
+        
+        return (np.concatenate(xs) if xs else np.empty(0, dtype=np.float64),
+                np.concatenate(ys) if ys else np.empty(0, dtype=np.float64),
+                [_Column.concat(vtype, column_chunks)
+                 for vtype, column_chunks in zip(field_types, chunks)])
+
+    def _parse_data_lines(self, f, field_types, size, feedback):
+        """Построчный разбор секции DATA"""
+        xs = array('d')
+        ys = array('d')
+        builders = [_ColumnBuilder(vtype) for vtype in field_types]
+        consumed = 0
+        
+        for count, line in enumerate(f):
+            consumed += len(line)
+            if count % _CHUNK_ROWS == 0:
+                feedback.check_canceled()
+                feedback.set_progress(consumed / size)
+            if line.startswith('DATA:'):
+                parts = line.strip().split(':', 1)[1].split(',')
+                if len(parts) < 2:
+                    continue
                 
-                # Чтение данных
-                for line in f:
-                    if line.startswith('DATA:'):
-                        parts = line.strip().split(':', 1)[1].split(',')
-                        if len(parts) < 2:
-                            continue
-                            
-                        feat = QgsFeature(self._fields)
-                        
-                        # Парсинг геометрии
-                        try:
-                            x, y = float(parts[0]), float(parts[1])
-                            feat.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
-                        except ValueError:
-                            # Если не удалось распарсить координаты
-                            continue
-                        
-                        # Установка атрибутов
-                        attrs = []
-                        for i in range(2, min(len(parts), len(self._fields) + 2)):
-                            value = parts[i]
-                            field_type = self._fields[i-2].type()
-                            attrs.append(self._convert_value(value, field_type))
-                        
-                        # Заполняем недостающие атрибуты значениями None
-                        while len(attrs) < len(self._fields):
-                            attrs.append(None)
-                            
-                        feat.setAttributes(attrs)
-                        self._all_features.append(feat)
-        except Exception as e:
-            QMessageBox.warning(None, "Ошибка загрузки", f"Не удалось загрузить файл: {str(e)}")
-            self._fields = QgsFields()
-            self._all_features = []
+                # Парсинг геометрии
+                try:
+                    x, y = float(parts[0]), float(parts[1])
+                except ValueError:
+                    # Если не удалось распарсить координаты
+                    continue
+                xs.append(x)
+                ys.append(y)
+                
+                # Установка атрибутов; недостающие заполняются значениями None
+                for i, builder in enumerate(builders):
+                    if i + 2 < len(parts):
+                        builder.append(self._convert_value(parts[i + 2], builder.vtype, False))
+                    else:
+                        builder.append(None)
+        
+        return (np.frombuffer(xs, dtype=np.float64).copy(),
+                np.frombuffer(ys, dtype=np.float64).copy(),
+                [builder.finish() for builder in builders])
+
+    def _parse_data_bulk(self, f, field_types, size, feedback, polygons=None):
+        """Блочный разбор секции DATA: файл читается большими блоками,
+        а колонки конвертируются целиком средствами NumPy.
+
+        Если передан список polygons, разбираются записи POLY, а кольца
+        каждого блока добавляются в него.
+        """
+        xs, ys = [], []
+        chunks = [[] for _ in field_types]
+        tail = ''
+        consumed = 0
+        
+        while True:
+            feedback.check_canceled()
+            block = f.read(_BLOCK_CHARS)
+            if not block:
+                break
+            consumed += len(block)
+            feedback.set_progress(consumed / size)
+            lines = (tail + block).split('\n')
+            # Последняя строка блока может быть неполной
+            tail = lines.pop()
+            self._parse_lines(lines, field_types, xs, ys, chunks, polygons)
+        if tail:
+            self._parse_lines([tail], field_types, xs, ys, chunks, polygons)
+        
+        return (np.concatenate(xs) if xs else np.empty(0, dtype=np.float64),
+                np.concatenate(ys) if ys else np.empty(0, dtype=np.float64),
+                [_Column.concat(vtype, column_chunks)
+                 for vtype, column_chunks in zip(field_types, chunks)])
+
+    @classmethod
+    def _parse_lines(cls, lines, field_types, xs, ys, chunks, polygons=None):
+        if polygons is None:
+            cls._parse_block(lines, field_types, xs, ys, chunks)
+        else:
+            cls._parse_polygon_block(lines, field_types, polygons, chunks)
+
+    @classmethod
+    def _parse_polygon_block(cls, lines, field_types, polygons, chunks):
+        """Разбирает записи POLY блока: кольца - первое значение записи"""
+        width = len(field_types) + 1
+        rows = [line.strip()[5:].split(',') for line in lines if line.startswith('POLY:')]
+        rows = [row[:width] if len(row) >= width else row + [''] * (width - len(row))
+                for row in rows]
+        if not rows:
+            return
+        
+        table = np.empty((len(rows), width), dtype=object)
+        table[:] = rows
+        store, valid = _PolygonStore.parse(table[:, 0].tolist())
+        if not valid.all():
+            # Записи с некорректными кольцами пропускаются
+            table = table[valid]
+        
+        polygons.append(store)
+        for i, vtype in enumerate(field_types):
+            chunks[i].append(cls._bulk_column(table[:, i + 1], vtype))
+
+    @classmethod
+    def _parse_block(cls, lines, field_types, xs, ys, chunks):
+        """Разбирает строки одного блока и добавляет порции колонок"""
+        width = len(field_types) + 2
+        records = [line.strip()[5:] for line in lines if line.startswith('DATA:')]
+        if not records:
+            return
+        commas = np.fromiter((record.count(',') for record in records), dtype=np.int64,
+                             count=len(records))
+        if (commas == width - 1).all():
+            # Обычный случай: у всех записей полный набор значений. Один
+            # плоский список строк вместо списка на каждую запись: миллионы
+            # живых списков заставляли сборщик мусора раз за разом обходить
+            # их все, и разбор замедлялся с ростом блока
+            table = np.array(','.join(records).split(','), dtype=object).reshape(-1, width)
+        else:
+            rows = [record.split(',') for record in records]
+            # Строки короче двух значений пропускаются; недостающие атрибуты
+            # дополняются пустой строкой, которая так же, как и отсутствие
+            # значения, превращается в NULL
+            rows = [row[:width] if len(row) >= width else row + [''] * (width - len(row))
+                    for row in rows if len(row) >= 2]
+            if not rows:
+                return
+            table = np.empty((len(rows), width), dtype=object)
+            table[:] = rows
+        
+        x, x_ok = cls._bulk_coordinates(table[:, 0])
+        y, y_ok = cls._bulk_coordinates(table[:, 1])
+        valid = x_ok & y_ok
+        if not valid.all():
+            # Строки с некорректными координатами пропускаются
+            table = table[valid]
+            x = x[valid]
+            y = y[valid]
+        
+        xs.append(x)
+        ys.append(y)
+        for i, vtype in enumerate(field_types):
+            chunks[i].append(cls._bulk_column(table[:, i + 2], vtype))
+
+    @staticmethod
+    def _bulk_coordinates(strings):
+        """Конвертирует колонку координат; возвращает значения и маску успешных"""
+        try:
+            return strings.astype(str).astype(np.float64), np.ones(len(strings), dtype=bool)
+        except ValueError:
+            values = np.zeros(len(strings), dtype=np.float64)
+            ok = np.zeros(len(strings), dtype=bool)
+            for i, value in enumerate(strings.tolist()):
+                try:
+                    values[i] = float(value)
+                    ok[i] = True
+                except ValueError:
+                    pass
+            return values, ok
+
+    @classmethod
+    def _bulk_column(cls, strings, vtype):
+        """Конвертирует колонку строк в типизированную колонку"""
+        nulls = strings == ''
+        dtype = _NUMPY_DTYPES.get(vtype)
+        if dtype is None:
+            # Строки и даты хранятся как есть
+            values = strings.copy()
+            values[nulls] = None
+            return _Column(vtype, values, nulls)
+        if vtype == QVariant.Bool:
+            lowered = np.char.lower(strings.astype(str))
+            return _Column(vtype, np.isin(lowered, ['true', '1', 'yes']) & ~nulls, nulls)
+        try:
+            filled = np.where(nulls, '0', strings).astype(str)
+            return _Column(vtype, filled.astype(dtype), nulls)
+        except (ValueError, OverflowError):
+            # Есть значения, которые не приводятся к типу: разбираем поштучно
+            return _Column.from_values(
+                vtype, [cls._convert_value(value, vtype, False) for value in strings.tolist()])
 
     def _map_type(self, ftype):
         """Сопоставление типов данных"""
-        type_map = {
-            'int': QVariant.Int,
-            'integer': QVariant.Int,
-            'double': QVariant.Double,
-            'float': QVariant.Double,
-            'string': QVariant.String,
-            'text': QVariant.String,
-            'date': QVariant.Date,
-            'datetime': QVariant.DateTime,
-            'bool': QVariant.Bool
-        }
-        return type_map.get(ftype.lower(), QVariant.String)
-
-    def _convert_value(self, value, vtype):
+        return _TYPE_MAP.get(ftype.lower(), QVariant.String)
+
+    @staticmethod
+    def _convert_value(value, vtype, convert_dates=True):
         """Конвертация строковых значений в нужный тип"""
         if value == "":
             return None
@@ -164,9 +3276,10 @@ class CustomVectorDataProvider(QgsVectorDataProvider):
             elif vtype == QVariant.Double:
                 return float(value)
             elif vtype == QVariant.Date:
-                return QDate.fromString(value, Qt.ISODate)
+                # В колонках даты хранятся строками и разбираются при выдаче объекта
+                return QDate.fromString(value, Qt.ISODate) if convert_dates else value
             elif vtype == QVariant.DateTime:
-                return QDateTime.fromString(value, Qt.ISODate)
+                return QDateTime.fromString(value, Qt.ISODate) if convert_dates else value
             elif vtype == QVariant.Bool:
                 return value.lower() in ['true', '1', 'yes']
             return value
@@ -175,69 +3288,144 @@ class CustomVectorDataProvider(QgsVectorDataProvider):
 
     def apply_filter(self):
         """Применяет атрибутивный фильтр к данным"""
-        if not self._subset_string:
-            self._filtered_features = self._all_features[:]
-            return
+        self._set_filtered(self._select_rows(self._entry, self._subset_string))
+
+    def _set_filtered(self, filtered_idx):
+        self._filtered_idx = filtered_idx
+        # Маску fid держим синхронной с отфильтрованным набором
+        self._filter_mask = np.zeros(len(self._dataset), dtype=bool)
+        self._filter_mask[self._filtered_idx] = True
+        self._point_grid = None
+        self._pyramid = None
+        self._stats = _LayerStats(self._dataset, self._filtered_idx, self._entry.attribute_indexes)
+
+    def _select_rows(self, entry, subset_string, rows=None, context=None):
+        """Возвращает номера строк (из rows или из всех), удовлетворяющих строке подмножества"""
+        all_rows = np.arange(len(entry.dataset), dtype=np.int64) if rows is None else rows
+        if entry.deleted.any():
+            all_rows = all_rows[~entry.deleted[all_rows]]
+            rows = all_rows
+        if not subset_string:
+            return all_rows
         
         try:
-            expression = QgsExpression(self._subset_string)
+            expression = QgsExpression(subset_string)
             if expression.hasParserError():
                 print(f"Ошибка парсера: {expression.parserErrorString()}")
-                self._filtered_features = self._all_features[:]
-                return
-            
-            context = QgsExpressionContext()
-            context.appendScope(QgsExpressionContextUtils.globalScope())
-            context.appendScope(QgsExpressionContextUtils.projectScope(QgsProject.instance()))
-            
-            self._filtered_features = []
-            for feature in self._all_features:
-                context.setFeature(feature)
-                if expression.evaluate(context):
-                    self._filtered_features.append(feature)
+                return all_rows
+            with self._profiler.timed('filter'):
+                return self._evaluate_rows(expression, rows=rows, context=context, entry=entry)
         except Exception as e:
             print(f"Ошибка применения фильтра: {str(e)}")
-            self._filtered_features = self._all_features[:]
+            return all_rows
+
+    def _evaluate_rows(self, expression, rows=None, context=None, entry=None):
+        """Номера строк (из rows или из всех), для которых выражение истинно"""
+        if entry is None:
+            entry = self._entry
+        dataset = entry.dataset
+        compiler = _PredicateCompiler(dataset, entry.attribute_indexes)
+        
+        # Атрибутивные индексы сужают набор строк, которые нужно проверить
+        candidates = compiler.index_candidates(expression)
+        if candidates is not None:
+            rows = candidates if rows is None else np.intersect1d(rows, candidates)
+        
+        # Типовые фильтры вычисляются над колонками целиком
+        predicate = compiler.compile(expression)
+        if predicate is not None:
+            true, _ = predicate(rows)
+            return np.flatnonzero(true) if rows is None else rows[true]
+        
+        # Остальные выражения вычисляются движком QGIS для каждого объекта
+        if rows is None:
+            rows = np.arange(len(dataset), dtype=np.int64)
+        if context is None:
+            context = self._expression_context()
+        
+        # Один объект переиспользуется для всех строк
+        feature = QgsFeature(dataset.fields)
+        selected = np.zeros(len(rows), dtype=bool)
+        for i, row in enumerate(rows.tolist()):
+            context.setFeature(dataset.feature(row, feature))
+            if expression.evaluate(context):
+                selected[i] = True
+        return rows[selected]
+
+    @staticmethod
+    def _expression_context():
+        """Контекст вычисления фильтра: глобальная и проектная области.
+
+        Собирается в основном потоке, фоновая загрузка получает его готовым.
+        """
+        context = QgsExpressionContext()
+        context.appendScope(QgsExpressionContextUtils.globalScope())
+        context.appendScope(QgsExpressionContextUtils.projectScope(QgsProject.instance()))
+        return context
 
     def _build_spatial_index(self):
         """Строит пространственный индекс для быстрого поиска"""
-        self._spatial_index = QgsSpatialIndex()
-        for feature in self._filtered_features:
-            if feature.hasGeometry():
-                self._spatial_index.addFeature(feature)
+        self._spatial_index = self._index_for(self._entry, self._filtered_idx)
+
+    def _index_for(self, entry, filtered_idx):
+        """Пространственный индекс по отфильтрованным строкам записи"""
+        with self._profiler.timed('index'):
+            return self._index_rows(entry, filtered_idx)
+
+    @staticmethod
+    def _index_rows(entry, filtered_idx):
+        dataset = entry.dataset
+        if len(filtered_idx) == len(dataset):
+            # Фильтр не отбросил ни одной строки: подходит индекс по всем строкам
+            if entry.full_index is None:
+                entry.full_index = _PackedPointIndex.build(dataset.x, dataset.y, filtered_idx)
+            return entry.full_index
+        if (entry.full_index is not None and
+                len(filtered_idx) >= _MASKED_INDEX_MIN_FRACTION * len(dataset)):
+            # Общий индекс уже есть, а фильтр оставил большую часть строк
+            mask = np.zeros(len(dataset), dtype=bool)
+            mask[filtered_idx] = True
+            return _MaskedIndex(entry.full_index, mask)
+        return _PackedPointIndex.build(dataset.x, dataset.y, filtered_idx)
 
     # Реализация обязательных методов провайдера
     def wkbType(self):
-        return QgsWkbTypes.Point
+        return QgsWkbTypes.Polygon if self.polygon_file else QgsWkbTypes.Point
 
     def crs(self):
         return self._crs
 
     def featureCount(self):
-        return len(self._filtered_features)
+        if self._lines is not None:
+            # Без полного прохода число объектов известно только без фильтра
+            return QgsVectorDataProvider.UnknownCount if self._subset_string else len(self._lines)
+        if self._estimated_count is not None and len(self._dataset):
+            # Оценка для всего файла с поправкой на долю прошедших фильтр
+            return int(round(self._estimated_count * self._stats.count / len(self._dataset)))
+        return self._stats.count
 
     def fields(self):
+        if self.lod_mode == 'aggregate':
+            # Сводные объекты несут число точек отдельным полем
+            fields = QgsFields(self._fields)
+            fields.append(QgsField(_LOD_COUNT_FIELD, QVariant.Int))
+            return fields
         return self._fields
 
+    def _lod_pyramid(self):
+        """Пирамида сеток по отфильтрованным строкам; сама пирамида строится
+        при первом запросе отрисовки, а не при создании источника"""
+        if self._pyramid is None:
+            self._pyramid = _LazyPyramid(self._dataset.x, self._dataset.y, self._filtered_idx,
+                                         self._profiler)
+        return self._pyramid
+
+    def featureSource(self):
+        return CustomFeatureSource(self)
+
     def getFeatures(self, request=QgsFeatureRequest()):
         """Возвращает итератор объектов с учетом всех фильтров"""
-        # Пространственный фильтр
-        if request.filterRect() and request.filterRect().isFinite():
-            rect = request.filterRect()
-            candidate_ids = self._spatial_index.intersects(rect)
-            
-            for fid in candidate_ids:
-                feature = next((f for f in self._filtered_features if f.id() == fid), None)
-                if feature and feature.hasGeometry():
-                    # Точная проверка пересечения
-                    engine = QgsGeometry.createGeometryEngine(feature.geometry().constGet())
-                    engine.prepareGeometry()
-                    if engine.intersects(rect.constGet()):
-                        yield feature
-        else:
-            # Возвращаем все объекты
-            for feature in self._filtered_features:
-                yield feature
+        return CustomFeatureSource(self).getFeatures(request)
 
     def identify(self, point, tolerance, layer_units_per_pixel, context):
         """
@@ -252,28 +3440,100 @@ class CustomVectorDataProvider(QgsVectorDataProvider):
         results = []
         search_radius = tolerance * layer_units_per_pixel
         
-        # Создаем область поиска (круг)
-        search_area = QgsGeometry.fromPointXY(point).buffer(search_radius, 5)
-        
-        # Используем пространственный индекс для поиска кандидатов
-        candidate_ids = self._spatial_index.intersects(search_area.boundingBox())
-        
-        # Проверяем точное попадание
-        for fid in candidate_ids:
-            feature = next((f for f in self._filtered_features if f.id() == fid), None)
-            if feature and feature.hasGeometry():
-                # Проверяем попадание в геометрию
-                if feature.geometry().intersects(search_area):
-                    result = QgsMapToolIdentify.IdentifyResult()
-                    result.mLayer = self.vectorLayer()
-                    result.mFeature = feature
-                    results.append(result)
+        with self._profiler.timed('identify'):
+            # Точки в круге поиска, от ближайшей к дальней
+            if self._lines is not None:
+                features = [feature for _, feature in self._lazy_within(point, search_radius)]
+            elif self._dataset.polygons is not None:
+                features = [self._dataset.feature(row)
+                            for _, row in self._polygons_within(point, search_radius)]
+            else:
+                rows, _ = self._grid().within(point.x(), point.y(), search_radius)
+                features = [self._dataset.feature(row) for row in rows.tolist()]
+            for feature in features:
+                result = QgsMapToolIdentify.IdentifyResult()
+                result.mLayer = self.vectorLayer()
+                result.mFeature = feature
+                results.append(result)
         
         return results
 
+    def _grid(self):
+        if self._point_grid is None:
+            with self._profiler.timed('grid'):
+                self._point_grid = _PointGrid(self._dataset.x, self._dataset.y, self._filtered_idx)
+        return self._point_grid
+
+    def nearestNeighbor(self, point, neighbors=1, maxDistance=0):
+        """Идентификаторы ближайших к точке объектов, по возрастанию расстояния.
+
+        Как у QgsSpatialIndex.nearestNeighbor: maxDistance = 0 - без ограничения.
+        Расстояние до полигона считается по центру его охватывающего прямоугольника.
+        """
+        if self._lines is not None:
+            return self._lazy_nearest(point, neighbors, maxDistance or None)
+        rows, _ = self._grid().nearest(point.x(), point.y(), neighbors, maxDistance or None)
+        return rows.tolist()
+
+    def featuresWithinDistance(self, point, distance):
+        """Идентификаторы объектов не дальше distance от точки, по возрастанию расстояния"""
+        if self._lines is not None:
+            return [feature.id() for _, feature in self._lazy_within(point, distance)]
+        if self._dataset.polygons is not None:
+            return [row for _, row in self._polygons_within(point, distance)]
+        rows, _ = self._grid().within(point.x(), point.y(), distance)
+        return rows.tolist()
+
+    def _polygons_within(self, point, radius):
+        """[(расстояние, строка)] полигонов не дальше radius от точки, по возрастанию расстояния"""
+        if self._spatial_index is None:
+            return []
+        rows = self._dataset.polygons.rows_in(self._spatial_index, point.x() - radius, point.y() - radius,
+                                              point.x() + radius, point.y() + radius)
+        target = QgsGeometry.fromPointXY(point)
+        found = []
+        for row in rows.tolist():
+            distance = self._dataset.geometry(row).distance(target)
+            if distance <= radius:
+                found.append((distance, row))
+        found.sort()
+        return found
+
+    def _lazy_within(self, point, radius):
+        """[(расстояние, объект)] в круге, по возрастанию расстояния (режим access=lazy)"""
+        rect = QgsRectangle(point.x() - radius, point.y() - radius,
+                            point.x() + radius, point.y() + radius)
+        found = []
+        for feature in self.getFeatures(QgsFeatureRequest().setFilterRect(rect)):
+            distance = feature.geometry().asPoint().distance(point)
+            if distance <= radius:
+                found.append((distance, feature))
+        found.sort(key=lambda item: (item[0], item[1].id()))
+        return found
+
+    def _lazy_nearest(self, point, neighbors, max_distance):
+        """k ближайших по расширяющемуся кругу: все точки внутри круга найдены точно"""
+        if not self._lines.extent or neighbors <= 0:
+            return []
+        xmin, ymin, xmax, ymax = self._lines.extent
+        # Радиус, при котором круг накрывает весь экстент
+        full = max(abs(point.x() - x) for x in (xmin, xmax)) + max(abs(point.y() - y) for y in (ymin, ymax))
+        radius = self._lines.tiles.cell if len(self._lines.tiles) else full
+        while True:
+            if max_distance is not None:
+                radius = min(radius, max_distance)
+            found = self._lazy_within(point, radius)
+            if len(found) >= neighbors or radius >= full or radius == max_distance:
+                return [feature.id() for _, feature in found[:neighbors]]
+            radius *= 2
+
     def setSubsetString(self, subset):
         """Устанавливает атрибутивный фильтр"""
         self._subset_string = subset
+        if self._lines is not None:
+            # Фильтр применяется итераторами при разборе строк
+            self.dataChanged.emit()
+            return True
         self.apply_filter()
         self._build_spatial_index()
         self.dataChanged.emit()
@@ -283,30 +3543,665 @@ class CustomVectorDataProvider(QgsVectorDataProvider):
         return self._subset_string
 
     def capabilities(self):
-        return (QgsVectorDataProvider.SelectAtId | 
-                QgsVectorDataProvider.ReadLayerInfo |
-                QgsVectorDataProvider.SelectAtId |
-                QgsVectorDataProvider.CreateSpatialIndex |
-                QgsVectorDataProvider.FastTruncate |
-                QgsVectorDataProvider.SelectEncoding |
-                QgsVectorDataProvider.CreateAttributeIndex |
-                QgsVectorDataProvider.DeleteFeatures |
-                QgsVectorDataProvider.ChangeAttributeValues)
+        capabilities = (QgsVectorDataProvider.SelectAtId | 
+                        QgsVectorDataProvider.ReadLayerInfo |
+                        QgsVectorDataProvider.SelectAtId |
+                        QgsVectorDataProvider.CreateSpatialIndex |
+                        QgsVectorDataProvider.FastTruncate |
+                        QgsVectorDataProvider.SelectEncoding |
+                        QgsVectorDataProvider.CreateAttributeIndex |
+                        QgsVectorDataProvider.DeleteFeatures |
+                        QgsVectorDataProvider.ChangeAttributeValues)
+        if self._lines is not None or self.sample_rows:
+            # Строки читаются из файла по запросу или это выборка: править нечего
+            capabilities &= ~(QgsVectorDataProvider.DeleteFeatures |
+                              QgsVectorDataProvider.ChangeAttributeValues)
+        if self.lod_mode:
+            # Отрисовщик передает допуск упрощения (размер пикселя) в запросе
+            capabilities |= QgsVectorDataProvider.SimplifyGeometries
+        return capabilities
 
     def extent(self):
         """Возвращает экстент слоя"""
-        bbox = QgsRectangle()
-        for feature in self._filtered_features:
-            if feature.hasGeometry():
-                bbox.combineExtentWith(feature.geometry().boundingBox())
-        return bbox
+        if self._lines is not None:
+            # Экстент всего файла, сохраненный в индексе строк
+            return QgsRectangle(*self._lines.extent) if self._lines.extent else QgsRectangle()
+        return QgsRectangle(self._stats.extent)
+
+    def createAttributeIndex(self, field):
+        """Строит индекс поля; он общий для всех провайдеров этого файла"""
+        if self._lines is not None:
+            return False
+        if field < 0 or field >= len(self._dataset.columns):
+            return False
+        indexes = self._entry.attribute_indexes
+        if field not in indexes:
+            index = _AttributeIndex.build(self._dataset.columns[field])
+            if index is None:
+                return False
+            indexes[field] = index
+        return True
 
     def uniqueValues(self, fieldIndex, limit=-1):
-        """Возвращает уникальные значения поля"""
-        values = set()
-        for feature in self._all_features:
-            values.add(feature.attribute(fieldIndex))
-        return list(values)[:limit] if limit > 0 else list(values)
+        """Возвращает уникальные значения поля среди отфильтрованных строк"""
+        if self._lines is not None:
+            return super().uniqueValues(fieldIndex, limit)
+        stats = self._stats.field(fieldIndex)
+        if stats is None:
+            return []
+        column = self._dataset.columns[fieldIndex]
+        distinct = stats.distinct
+        if stats.distinct_count > len(distinct) and not 0 < limit <= len(distinct):
+            # Значений больше, чем хранится в статистике: собираем их заново
+            rows = self._filtered_idx[~column.nulls[self._filtered_idx]]
+            distinct = list(dict.fromkeys(column.values[rows].tolist()))
+        values = [column.to_qgis(value) for value in distinct]
+        if stats.null_count:
+            values.append(None)
+        return values[:limit] if limit > 0 else values
+
+    def _extreme_value(self, fieldIndex, last):
+        """Минимальное или максимальное значение поля среди отфильтрованных строк"""
+        if self._lines is not None:
+            return super().maximumValue(fieldIndex) if last else super().minimumValue(fieldIndex)
+        stats = self._stats.field(fieldIndex)
+        if stats is None:
+            return None
+        if not stats.comparable:
+            return super().maximumValue(fieldIndex) if last else super().minimumValue(fieldIndex)
+        column = self._dataset.columns[fieldIndex]
+        return column.to_qgis(stats.maximum if last else stats.minimum)
+
+    def minimumValue(self, fieldIndex):
+        return self._extreme_value(fieldIndex, False)
+
+    def maximumValue(self, fieldIndex):
+        return self._extreme_value(fieldIndex, True)
+
+    # Профилирование
+    def profile(self):
+        """Время операций и счетчики с момента открытия или последнего сброса.
+
+        Пустой словарь разделов, если профилирование выключено.
+        """
+        return self._profiler.snapshot()
+
+    def resetProfile(self):
+        self._profiler.reset()
+
+    def profileSummary(self):
+        """Сводка профилирования в текстовом виде"""
+        return self._profiler.summary()
+
+    def _log_profile(self):
+        summary = self._profiler.summary()
+        if summary:
+            QgsMessageLog.logMessage(f"Профиль {os.path.basename(self.file_path)}:\n{summary}",
+                                     'MYVEC', Qgis.Info)
+
+    # Редактирование: правки дописываются в журнал, файл переписывается при сжатии
+    def _editable(self):
+        return (self._lines is None and self._load_task is None and self._valid and
+                not self.sample_rows)
+
+    def _journal_edit(self, operation):
+        """Записывает операцию в журнал и применяет ее к данным.
+
+        Запись реестра общая: отбор строк, индексы и статистика обновляются
+        во всех провайдерах, открывших этот файл.
+        """
+        try:
+            self._journal.append(operation)
+        except (OSError, TypeError, ValueError) as e:
+            self._report_error(f"Не удалось записать журнал правок: {str(e)}")
+            return False
+        _EditJournal.apply(self._entry, operation)
+        for provider in list(self._entry.providers):
+            if not sip.isdeleted(provider):
+                provider._edited(operation)
+        return True
+
+    def _edited(self, operation):
+        """Обновляет отфильтрованные строки после правки общей записи"""
+        if operation['op'] == 'delete':
+            deleted = self._entry.deleted
+            self._set_filtered(self._filtered_idx[~deleted[self._filtered_idx]])
+            self._build_spatial_index()
+        elif self._subset_string:
+            # Измененные строки могли войти в фильтр или выйти из него
+            self.apply_filter()
+            self._build_spatial_index()
+        else:
+            self._set_filtered(self._filtered_idx)
+        self.clearMinMaxCache()
+        self.dataChanged.emit()
+
+    def deleteFeatures(self, ids):
+        """Удаляет объекты; fid остальных объектов не меняются до сжатия журнала"""
+        if not self._editable():
+            return False
+        deleted = self._entry.deleted
+        fids = np.fromiter(ids, dtype=np.int64)
+        fids = np.unique(fids[(fids >= 0) & (fids < len(deleted))])
+        fids = fids[~deleted[fids]]
+        if not len(fids):
+            return True
+        return self._journal_edit({'op': 'delete', 'fids': fids.tolist()})
+
+    def changeAttributeValues(self, attr_map):
+        """Изменяет значения атрибутов: {fid: {номер поля: значение}}"""
+        if not self._editable():
+            return False
+        dataset = self._dataset
+        deleted = self._entry.deleted
+        values = []
+        for fid, attributes in attr_map.items():
+            if not 0 <= fid < len(dataset) or deleted[fid]:
+                continue
+            for index, value in attributes.items():
+                # Вычисляемые поля полигонов не редактируются
+                if not 0 <= index < len(self._field_specs):
+                    continue
+                value = _edit_value(value, dataset.columns[index].vtype)
+                if isinstance(value, str) and (',' in value or '\n' in value):
+                    self._report_error(
+                        f"Значение {value!r} содержит запятую или перевод строки и не может быть записано в файл")
+                    return False
+                values.append([fid, index, value])
+        if not values:
+            return True
+        return self._journal_edit({'op': 'change', 'values': values})
+
+    def fixOrientation(self, exterior='ccw'):
+        """Разворачивает кольца полигонов с неверным обходом.
+
+        exterior='ccw': внешние кольца против часовой стрелки, отверстия по
+        ней (как в GeoJSON); 'cw' - наоборот (как в шейп-файлах). Правка
+        пишется в журнал. Возвращает число развернутых колец или -1, если
+        слой не полигональный или не редактируется.
+        """
+        if not self._editable() or self._dataset.polygons is None or exterior not in ('ccw', 'cw'):
+            return -1
+        count = int(self._dataset.polygons.misoriented(exterior == 'ccw').sum())
+        if not count:
+            return 0
+        if not self._journal_edit({'op': 'orient', 'exterior': exterior}):
+            return -1
+        return count
+
+    def compactJournal(self, background=False):
+        """Переписывает файл с учетом правок и удаляет журнал.
+
+        После сжатия fid объектов идут подряд, поэтому у удаленных ранее
+        строк их номера занимают следующие. При background=True файл
+        пишется в задаче QGIS; правка во время записи отменяет сжатие.
+        Файл со строками, которые разбор пропустил, не сжимается: они
+        были бы потеряны.
+        """
+        if not self._editable() or self._compact_task is not None or not self._journal.exists():
+            return False
+        task = _CompactTask(self)
+        if background:
+            self._compact_task = task
+            QgsApplication.taskManager().addTask(task)
+            return True
+        task.finished(task.run())
+        return task.error is None
+
+    def compactTask(self):
+        """Задача фонового сжатия журнала или None"""
+        return self._compact_task
+
+    def _finish_compaction(self, task):
+        """Подменяет файл сжатым и подключает данные без повторного разбора"""
+        self._compact_task = None
+        if task.error is None and (self._journal.size() != task.journal_size or
+                                   _file_signature(self.file_path) != task.signature or
+                                   task.dataset is not self._dataset):
+            task.error = "Файл или журнал правок изменились во время сжатия"
+        if task.error is not None:
+            task.discard()
+            self._report_error(task.error)
+            return
+        try:
+            os.replace(task.path, self.file_path)
+        except OSError as e:
+            task.discard()
+            self._report_error(f"Не удалось заменить файл: {str(e)}")
+            return
+        self._journal.remove()
+        
+        compacted = _DatasetEntry(self._field_specs, task.dataset.take(task.rows))
+        compacted.source_state = _source_state(self.file_path)
+        # fid старой записи не соответствуют новому файлу: на сжатые данные
+        # переходят все провайдеры, открывшие файл
+        for provider in list(self._entry.providers):
+            if not sip.isdeleted(provider):
+                provider._attach_compacted(compacted)
+
+    def _attach_compacted(self, compacted):
+        """Подключает запись сжатого файла вместо прежней"""
+        entry = _DATASET_REGISTRY.acquire(self.file_path, lambda: compacted)
+        self._install(entry, *self._prepare(entry, self._subset_string))
+        self.clearMinMaxCache()
+        self.dataChanged.emit()
+
+# 1.1 Источник и итератор объектов
+class CustomFeatureSource(QgsAbstractFeatureSource):
+    """Снимок состояния провайдера, из которого строятся итераторы.
+
+    Итераторы могут работать в потоках отрисовки, поэтому источник хранит
+    ссылки на данные, фильтр и индексы на момент создания и не зависит от
+    последующих вызовов setSubsetString.
+    """
+
+    def __init__(self, provider):
+        super().__init__()
+        self.dataset = provider._dataset
+        self.fields = provider.fields()
+        self.crs = provider.crs()
+        self.filtered_idx = provider._filtered_idx
+        self.filter_mask = provider._filter_mask
+        self.spatial_index = provider._spatial_index
+        self.attribute_indexes = provider._entry.attribute_indexes
+        # Режим access=lazy: строки разбираются итератором по запросу
+        self.lines = provider._lines
+        self.subset_string = provider._subset_string
+        self.read_rows = provider._read_rows
+        # Упрощенная отрисовка по пирамиде сеток
+        self.lod_mode = provider.lod_mode
+        self.lod_width = provider.lod_width
+        self.pyramid = provider._lod_pyramid() if provider.lod_mode and provider._lines is None else None
+        self.profiler = provider._profiler
+
+    def getFeatures(self, request=QgsFeatureRequest()):
+        # Время подготовки запроса: отбор кандидатов по индексам
+        with self.profiler.timed('getFeatures'):
+            if self.lines is not None:
+                iterator = CustomLineFeatureIterator(self, request)
+            else:
+                iterator = CustomFeatureIterator(self, request)
+        return QgsFeatureIterator(iterator)
+
+
+class CustomFeatureIterator(QgsAbstractFeatureIterator):
+    """Итератор, выполняющий все условия запроса внутри провайдера.
+
+    Кандидаты отбираются по fid, пространственному и атрибутивным индексам;
+    выражение вычисляется над кандидатами порциями, поэтому при заданном
+    limit() чтение останавливается, как только набрано нужное число объектов.
+    Объекты строятся только с запрошенными атрибутами и без геометрии при
+    флаге NoGeometry.
+    """
+    # Размер порции кандидатов для векторного предиката
+    BATCH_ROWS = 4096
+
+    def __init__(self, source, request):
+        super().__init__(request)
+        self._source = source
+        self._request = request if request is not None else QgsFeatureRequest()
+        
+        self._transform = QgsCoordinateTransform()
+        destination = self._request.destinationCrs()
+        if destination.isValid() and destination != source.crs:
+            self._transform = QgsCoordinateTransform(
+                source.crs, destination, self._request.transformContext())
+        # Ячейки упрощенной отрисовки: (число точек, центр x, центр y) для self._rows
+        self._lod = None
+        # Счетчики для профилирования: выданные объекты и строки, проверенные
+        # по прямоугольнику или выражению после отбора кандидатов
+        self._fetched = 0
+        self._reported = 0
+        self._tested = 0
+        try:
+            self._filter_rect = self.filterRectToSourceCrs(self._transform)
+        except QgsCsException:
+            # Прямоугольник не переводится в систему координат слоя
+            self._filter_rect = None
+            self._rows = np.empty(0, dtype=np.int64)
+        else:
+            self._rows = self._candidate_rows()
+        if source.profiler.enabled:
+            source.profiler.count('candidates', len(self._rows) if self._rows is not None else 0)
+        
+        flags = self._request.flags()
+        self._with_geometry = not (flags & QgsFeatureRequest.NoGeometry)
+        self._attributes = (list(self._request.subsetOfAttributes())
+                            if flags & QgsFeatureRequest.SubsetOfAttributes else None)
+        self._limit = self._request.limit()
+        self._setup_expression()
+        self.rewind()
+
+    def _candidate_rows(self):
+        """Строки, отобранные по fid, прямоугольнику и атрибутивным индексам"""
+        source = self._source
+        request = self._request
+        rect = self._filter_rect
+        use_rect = rect is not None and not rect.isNull() and rect.isFinite()
+        
+        # Выборка по идентификаторам (SelectAtId)
+        if request.filterType() == QgsFeatureRequest.FilterFid:
+            fids = [request.filterFid()]
+        elif request.filterType() == QgsFeatureRequest.FilterFids:
+            fids = sorted(request.filterFids())
+        else:
+            fids = None
+        
+        polygons = source.dataset.polygons
+        if fids is not None:
+            rows = np.array([fid for fid in fids if 0 <= fid < len(source.filter_mask)], dtype=np.int64)
+            rows = rows[source.filter_mask[rows]]
+            if use_rect:
+                self._tested += len(rows)
+                if polygons is not None:
+                    rows = rows[(polygons.xmin[rows] <= rect.xMaximum()) &
+                                (polygons.xmax[rows] >= rect.xMinimum()) &
+                                (polygons.ymin[rows] <= rect.yMaximum()) &
+                                (polygons.ymax[rows] >= rect.yMinimum())]
+                else:
+                    xs = source.dataset.x[rows]
+                    ys = source.dataset.y[rows]
+                    rows = rows[(xs >= rect.xMinimum()) & (xs <= rect.xMaximum()) &
+                                (ys >= rect.yMinimum()) & (ys <= rect.yMaximum())]
+        elif use_rect:
+            cells = self._lod_cells(rect)
+            if cells is not None:
+                rows, counts, center_x, center_y = cells
+                self._lod = (counts, center_x, center_y)
+                return rows
+            if polygons is not None:
+                # Индекс построен по центрам: окно расширяется на размер полигонов
+                rows = polygons.rows_in(source.spatial_index, rect.xMinimum(), rect.yMinimum(),
+                                        rect.xMaximum(), rect.yMaximum())
+            else:
+                # Индекс сам проверяет попадание точек в прямоугольник
+                rows = np.sort(source.spatial_index.intersects(rect))
+        else:
+            rows = source.filtered_idx
+        
+        if polygons is not None and use_rect and request.flags() & QgsFeatureRequest.ExactIntersect:
+            # Пересечение по прямоугольникам уточняется геометрией полигонов
+            self._tested += len(rows)
+            area = QgsGeometry.fromRect(rect)
+            rows = rows[np.fromiter((source.dataset.geometry(row).intersects(area)
+                                     for row in rows.tolist()), dtype=bool, count=len(rows))]
+        
+        if request.filterType() == QgsFeatureRequest.FilterExpression:
+            compiler = _PredicateCompiler(source.dataset, source.attribute_indexes)
+            candidates = compiler.index_candidates(request.filterExpression())
+            if candidates is not None:
+                rows = np.intersect1d(rows, candidates)
+        return rows
+
+    def _lod_cells(self, rect):
+        """Ячейки пирамиды размером с пиксель или None, если упрощать не нужно.
+
+        Упрощаются только запросы отрисовки без выражения и без точной
+        проверки пересечения (ее требуют, например, инструменты выделения).
+        Запрос считается запросом отрисовки, если в нем задан метод упрощения
+        с допуском или его контекст выражений содержит область настроек
+        карты (_LOD_RENDER_VARIABLE). Точечным слоям QGIS метод упрощения не
+        передает, поэтому обычно срабатывает второе условие. Остальные
+        запросы с прямоугольником (индекс привязки, объекты видимого
+        экстента в таблице атрибутов, алгоритмы обработки) получают
+        настоящие объекты. Упрощается и запрос модуля, который сам передает
+        контекст карты; отрисовка модулем без этого контекста не упрощается.
+        """
+        source = self._source
+        request = self._request
+        if (source.pyramid is None or request.filterType() != QgsFeatureRequest.FilterNone or
+                request.flags() & QgsFeatureRequest.ExactIntersect):
+            return None
+        method = request.simplifyMethod()
+        if method.methodType() != QgsSimplifyMethod.NoSimplification and method.tolerance() > 0:
+            cell_size = method.tolerance()
+        elif request.expressionContext().hasVariable(_LOD_RENDER_VARIABLE):
+            cell_size = rect.width() / source.lod_width
+        else:
+            return None
+        return source.pyramid.get().query(rect.xMinimum(), rect.yMinimum(),
+                                    rect.xMaximum(), rect.yMaximum(), cell_size)
+
+    def _setup_expression(self):
+        """Готовит векторный предикат или выражение QGIS для поштучной проверки"""
+        self._predicate = None
+        self._expression = None
+        if self._request.filterType() != QgsFeatureRequest.FilterExpression:
+            return
+        expression = self._request.filterExpression()
+        self._predicate = _PredicateCompiler(self._source.dataset).compile(expression)
+        if self._predicate is None:
+            self._expression = QgsExpression(expression)
+            self._context = QgsExpressionContext(self._request.expressionContext())
+            self._context.setFields(self._source.fields)
+            self._expression.prepare(self._context)
+            self._probe = QgsFeature(self._source.fields)
+
+    def _next_row(self):
+        while self._pending_pos >= len(self._pending):
+            if self._position >= len(self._rows):
+                return None
+            # Поштучно вычисляемое выражение проверяется по одной строке
+            size = self.BATCH_ROWS if self._expression is None else 1
+            batch = self._rows[self._position:self._position + size]
+            self._position += size
+            self._pending = self._filter_batch(batch)
+            self._pending_pos = 0
+        row = self._pending[self._pending_pos]
+        self._pending_pos += 1
+        return int(row)
+
+    def _filter_batch(self, rows):
+        if self._predicate is not None:
+            self._tested += len(rows)
+            true, _ = self._predicate(rows)
+            return rows[true]
+        if self._expression is not None:
+            self._tested += 1
+            row = int(rows[0])
+            self._context.setFeature(self._source.dataset.feature(row, self._probe))
+            return rows if self._expression.evaluate(self._context) else rows[:0]
+        return rows
+
+    def fetchFeature(self, f):
+        if self._limit >= 0 and self._fetched >= self._limit:
+            f.setValid(False)
+            self._report_counts()
+            return False
+        row = self._next_row()
+        if row is None:
+            f.setValid(False)
+            self._report_counts()
+            return False
+        self._fill_feature(f, self._source.dataset, row, row)
+        self._fetched += 1
+        return True
+
+    def _fill_feature(self, f, dataset, row, fid):
+        """Заполняет объект строкой row набора dataset"""
+        x, y = float(dataset.x[row]), float(dataset.y[row])
+        count = 1
+        if self._lod is not None:
+            # Представитель ячейки; сводный объект ставится в ее центр масс
+            cell = int(np.searchsorted(self._rows, row))
+            count = int(self._lod[0][cell])
+            if self._source.lod_mode == 'aggregate':
+                x, y = float(self._lod[1][cell]), float(self._lod[2][cell])
+        
+        f.setFields(self._source.fields, True)
+        f.setId(fid)
+        if self._attributes is None:
+            attributes = dataset.attributes(row)
+        else:
+            # Незапрошенные атрибуты остаются NULL
+            attributes = [None] * len(dataset.columns)
+            for index in self._attributes:
+                if 0 <= index < len(attributes):
+                    attributes[index] = dataset.columns[index].value(row)
+        if self._source.lod_mode == 'aggregate':
+            attributes.append(count)
+        f.setAttributes(attributes)
+        if self._with_geometry:
+            if dataset.polygons is not None:
+                f.setGeometry(dataset.geometry(row))
+            else:
+                f.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(x, y)))
+            self.geometryToDestinationCrs(f, self._transform)
+        else:
+            f.clearGeometry()
+        f.setValid(True)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        feature = QgsFeature()
+        if not self.nextFeature(feature):
+            raise StopIteration
+        return feature
+
+    def _report_counts(self):
+        """Передает профилировщику счетчики, накопленные с прошлого вызова"""
+        profiler = self._source.profiler
+        if profiler.enabled:
+            profiler.count('features', self._fetched - self._reported)
+            profiler.count('exact_tests', self._tested)
+        self._reported = self._fetched
+        self._tested = 0
+
+    def rewind(self):
+        self._report_counts()
+        self._position = 0
+        self._pending = self._rows[:0]
+        self._pending_pos = 0
+        self._fetched = 0
+        self._reported = 0
+        return True
+
+    def close(self):
+        self._rows = self._rows[:0]
+        self.rewind()
+        return True
+
+
+class CustomLineFeatureIterator(CustomFeatureIterator):
+    """Итератор режима access=lazy.
+
+    Кандидаты отбираются по fid или по тайлам, пересекающим прямоугольник;
+    их строки разбираются порциями по BATCH_ROWS, после чего к порции
+    применяются точная проверка прямоугольника, строка подмножества и
+    выражение запроса. В памяти держится только текущая порция.
+    """
+
+    def _candidate_rows(self):
+        """fid кандидатов или None, если нужно пройти весь файл"""
+        source = self._source
+        request = self._request
+        rect = self._filter_rect
+        self._rect = rect if rect is not None and not rect.isNull() and rect.isFinite() else None
+        if request.filterType() == QgsFeatureRequest.FilterFid:
+            fids = [request.filterFid()]
+        elif request.filterType() == QgsFeatureRequest.FilterFids:
+            fids = sorted(request.filterFids())
+        else:
+            fids = None
+        
+        if fids is not None:
+            return np.array([fid for fid in fids if 0 <= fid < len(source.lines)], dtype=np.int64)
+        if self._rect is not None:
+            return source.lines.tiles.rows_in(self._rect.xMinimum(), self._rect.yMinimum(),
+                                              self._rect.xMaximum(), self._rect.yMaximum())
+        return None
+
+    def _setup_expression(self):
+        """Строка подмножества и выражение запроса проверяются для каждой порции"""
+        texts = []
+        if self._source.subset_string:
+            texts.append(self._source.subset_string)
+        if self._request.filterType() == QgsFeatureRequest.FilterExpression:
+            texts.append(self._request.filterExpression().expression())
+        self._context = QgsExpressionContext(self._request.expressionContext())
+        self._context.setFields(self._source.fields)
+        self._expressions = []
+        for text in texts:
+            expression = QgsExpression(text)
+            expression.prepare(self._context)
+            self._expressions.append(expression)
+
+    def _total(self):
+        return len(self._source.lines) if self._rows is None else len(self._rows)
+
+    def _next_row(self):
+        while self._pending_pos >= len(self._pending):
+            if self._position >= self._total():
+                return None
+            end = min(self._position + self.BATCH_ROWS, self._total())
+            if self._rows is None:
+                fids = np.arange(self._position, end, dtype=np.int64)
+            else:
+                fids = self._rows[self._position:end]
+            self._position = end
+            self._batch = self._source.read_rows(self._source.lines, fids)
+            self._batch_fids = fids
+            self._pending = self._filter_batch(self._batch, fids)
+            self._pending_pos = 0
+        row = self._pending[self._pending_pos]
+        self._pending_pos += 1
+        return int(row)
+
+    def _filter_batch(self, dataset, fids):
+        """Номера строк порции, прошедших все условия"""
+        keep = np.ones(len(dataset), dtype=bool)
+        rect = self._rect
+        if rect is not None or self._expressions:
+            self._tested += len(dataset)
+        if rect is not None:
+            keep &= ((dataset.x >= rect.xMinimum()) & (dataset.x <= rect.xMaximum()) &
+                     (dataset.y >= rect.yMinimum()) & (dataset.y <= rect.yMaximum()))
+        for expression in self._expressions:
+            predicate = _PredicateCompiler(dataset).compile(expression)
+            if predicate is not None:
+                true, _ = predicate(None)
+                keep &= true
+                continue
+            probe = QgsFeature(self._source.fields)
+            for row in np.flatnonzero(keep).tolist():
+                dataset.feature(row, probe)
+                probe.setId(int(fids[row]))
+                self._context.setFeature(probe)
+                if not expression.evaluate(self._context):
+                    keep[row] = False
+        return np.flatnonzero(keep)
+
+    def fetchFeature(self, f):
+        if self._limit >= 0 and self._fetched >= self._limit:
+            f.setValid(False)
+            self._report_counts()
+            return False
+        row = self._next_row()
+        if row is None:
+            f.setValid(False)
+            self._report_counts()
+            return False
+        self._fill_feature(f, self._batch, row, int(self._batch_fids[row]))
+        self._fetched += 1
+        return True
+
+    def rewind(self):
+        self._report_counts()
+        self._position = 0
+        self._pending = np.empty(0, dtype=np.int64)
+        self._pending_pos = 0
+        self._fetched = 0
+        self._reported = 0
+        self._batch = None
+        return True
+
+    def close(self):
+        self._rows = np.empty(0, dtype=np.int64)
+        self.rewind()
+        return True
+
 
 # 2. Фабрика провайдера
 class CustomVectorProviderFactory(QgsVectorDataProviderFactory):
@@ -359,6 +4254,21 @@ class CustomOptionsWidget(QWidget):
         self.cache_checkbox = QCheckBox("Кэшировать данные")
         self.layout().addWidget(self.cache_checkbox)
         
+        self.index_checkbox = QCheckBox("Сохранять пространственный индекс")
+        self.layout().addWidget(self.index_checkbox)
+        
+        self.async_checkbox = QCheckBox("Загружать в фоне")
+        self.layout().addWidget(self.async_checkbox)
+        
+        self.lazy_checkbox = QCheckBox("Читать строки по запросу (большие файлы)")
+        self.layout().addWidget(self.lazy_checkbox)
+        
+        self.watch_checkbox = QCheckBox("Следить за изменениями файла")
+        self.layout().addWidget(self.watch_checkbox)
+        
+        self.lod_checkbox = QCheckBox("Упрощать отрисовку при мелком масштабе")
+        self.layout().addWidget(self.lod_checkbox)
+        
         self.layout().addStretch()
 
     def browse_file(self):
@@ -374,7 +4284,8 @@ class CustomOptionsWidget(QWidget):
             return
             
         # Создаем временный слой для диалога фильтрации
-        layer = QgsVectorLayer(f"myvec://?file={self.file_edit.text()}", "temp", "memory")
+        # Временный слой получает уже разобранный файл из общего реестра
+        layer = QgsVectorLayer(f"myvec://?file={self.file_edit.text()}", "temp", "my_custom_provider")
         if not layer.isValid():
             return
             
@@ -395,6 +4306,21 @@ class CustomOptionsWidget(QWidget):
         
         if self.cache_checkbox.isChecked():
             uri += "&cache=true"
+        
+        if self.index_checkbox.isChecked():
+            uri += "&index=file"
+        
+        if self.async_checkbox.isChecked():
+            uri += "&async=true"
+        
+        if self.lazy_checkbox.isChecked():
+            uri += "&access=lazy"
+        
+        if self.watch_checkbox.isChecked():
+            uri += "&watch=true"
+        
+        if self.lod_checkbox.isChecked():
+            uri += "&lod=thin"
             
         if self.current_filter:
             uri += f"&filter={self.current_filter}"
@@ -421,21 +4347,36 @@ class CustomPreviewWidget(QWidget):
         self.layout().addWidget(self.info_label)
         
         self.current_layer = None
+        self.current_uri = None
 
     def load_layer(self, uri):
-        """Загружает слой для предпросмотра"""
+        """Загружает слой для предпросмотра.
+
+        Читается только выборка строк, равномерная по файлу (sample=N),
+        поэтому предпросмотр большого файла не требует его полного разбора.
+        """
+        if uri == self.current_uri:
+            return
         if self.current_layer:
             QgsProject.instance().removeMapLayer(self.current_layer)
+        self.current_uri = uri
         
+        if 'sample=' not in uri:
+            uri += ('&' if '?' in uri else '?') + f'sample={_PREVIEW_ROWS}'
         self.current_layer = QgsVectorLayer(uri, "Preview Layer", "my_custom_provider")
         if self.current_layer.isValid():
             QgsProject.instance().addMapLayer(self.current_layer, False)
             self.canvas.setLayers([self.current_layer])
-            self.canvas.setExtent(self.current_layer.extent())
+            extent = self.current_layer.extent()
+            self.canvas.setExtent(extent)
             self.canvas.refresh()
             self.canvas.setMapTool(self.identify_tool)
             self.identify_tool.setLayer(self.current_layer)
+            self.info_label.setText(
+                f"Около {self.current_layer.featureCount()} объектов, экстент около "
+                f"{extent.toString(2)}. Выберите объект на карте")
         else:
+            self.current_uri = None
             self.info_label.setText("Ошибка загрузки слоя для предпросмотра")
 
     def on_feature_identified(self, feature):
@@ -519,26 +4460,78 @@ class CustomIdentifyTool(QgsMapToolIdentify):
         super().__init__(canvas)
     
     def identify(self, x, y, layerList, mode, tolerance=5):
-        """Переопределяем метод идентификации"""
-        results = []
+        """Идентификация за один проход по слоям.
+
+        Слои MYVEC опрашиваются через точечные индексы своих провайдеров
+        (слои с одинаковым источником - один раз), остальные передаются
+        базовой реализации одним вызовом. Результаты объединяются без
+        повторов объектов.
+        """
+        if not layerList:
+            # Пустой список, как и в QGIS, означает все слои карты
+            layerList = self.canvas().layers()
         point = self.toMapCoordinates(x, y)
-        layer_units_per_pixel = self.canvas().mapUnitsPerPixel()
         
+        if mode == QgsMapToolIdentify.TopDownStopAtFirst:
+            # Порядок слоев важен: первый слой с объектами завершает поиск
+            for layer in layerList:
+                if self._is_myvec(layer):
+                    results = self._identify_myvec(layer, point, tolerance, {})
+                else:
+                    results = super().identify(x, y, [layer], mode, tolerance)
+                if results:
+                    return results
+            return []
+        
+        results = []
+        others = []
+        found = {}
         for layer in layerList:
-            if isinstance(layer, QgsVectorLayer) and layer.dataProvider().name() == 'my_custom_provider':
-                # Используем нашу реализацию идентификации
-                results.extend(layer.dataProvider().identify(
-                    point,
-                    tolerance,
-                    layer_units_per_pixel,
-                    self.context()
-                ))
+            if self._is_myvec(layer):
+                results.extend(self._identify_myvec(layer, point, tolerance, found))
             else:
-                # Стандартная идентификация для других слоев
-                results.extend(super().identify(x, y, layerList, mode, tolerance))
-        
+                others.append(layer)
+        if others:
+            results.extend(super().identify(x, y, others, mode, tolerance))
+        return self._unique_results(results)
+
+    @staticmethod
+    def _is_myvec(layer):
+        return isinstance(layer, QgsVectorLayer) and layer.dataProvider().name() == 'my_custom_provider'
+
+    def _identify_myvec(self, layer, point, tolerance, found):
+        """Результаты для слоя MYVEC; found - уже найденные объекты по источнику слоя"""
+        # Провайдер ищет в координатах и единицах слоя
+        layer_point = self.toLayerCoordinates(layer, point)
+        key = (layer.source(), layer.subsetString(), layer.crs().authid())
+        if key not in found:
+            next_point = QgsPointXY(point.x() + self.canvas().mapUnitsPerPixel(), point.y())
+            layer_units_per_pixel = layer_point.distance(self.toLayerCoordinates(layer, next_point))
+            found[key] = [result.mFeature for result in layer.dataProvider().identify(
+                layer_point, tolerance, layer_units_per_pixel, self.context())]
+        results = []
+        for feature in found[key]:
+            result = QgsMapToolIdentify.IdentifyResult()
+            result.mLayer = layer
+            result.mFeature = feature
+            results.append(result)
         return results
 
+    @staticmethod
+    def _unique_results(results):
+        """Убирает повторы объектов одного слоя; результаты без объекта (растры) сохраняются"""
+        seen = set()
+        unique = []
+        for result in results:
+            feature = result.mFeature
+            if feature is not None and feature.isValid() and result.mLayer is not None:
+                key = (result.mLayer.id(), feature.id())
+                if key in seen:
+                    continue
+                seen.add(key)
+            unique.append(result)
+        return unique
+
 # 8. Инициализация плагина
 def initProvider():
     # Регистрация провайдера данных
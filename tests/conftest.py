@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture(scope='session')
+def qgis_app():
+    """Приложение QGIS без интерфейса на всю сессию тестов"""
+    core = pytest.importorskip('qgis.core')
+    app = core.QgsApplication([], False)
+    app.initQgis()
+    yield app
+    app.exitQgis()
+
+
+@pytest.fixture
+def provider_module(qgis_app):
+    """Модуль провайдера с пустым реестром разобранных файлов"""
+    import provider
+    provider._DATASET_REGISTRY.clear()
+    yield provider
+    provider._DATASET_REGISTRY.clear()
+
+
+@pytest.fixture
+def open_provider(provider_module):
+    """Открывает файл провайдером с параметрами URI"""
+    from qgis.core import QgsDataProvider
+
+    def open_(path, options=''):
+        uri = f'myvec://{path}' + (f'?{options}' if options else '')
+        provider = provider_module.CustomVectorDataProvider(uri, QgsDataProvider.ProviderOptions())
+        assert provider.isValid()
+        return provider
+    return open_
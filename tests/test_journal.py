@@ -0,0 +1,96 @@
+"""Журнал правок и его сжатие"""
+import gc
+import os
+
+HEADER = 'HEADER:i:int,s:string'
+ROWS = [f'DATA:{i}.0,{i}.5,{i},row {i}' for i in range(10)]
+
+
+def _write(path, lines):
+    with open(path, 'w', newline='\n') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def _attributes(provider):
+    from qgis.core import QgsFeatureRequest
+    return {feature.id(): feature.attributes() for feature in provider.getFeatures(QgsFeatureRequest())}
+
+
+def _reopen(provider_module, open_provider, path, provider):
+    """Открывает файл заново с разбором, а не из реестра"""
+    del provider
+    gc.collect()
+    provider_module._DATASET_REGISTRY.clear()
+    return open_provider(path)
+
+
+def _edit(provider):
+    assert provider.changeAttributeValues({0: {0: '42', 1: 'changed'}, 5: {1: None}})
+    assert provider.deleteFeatures([1, 2])
+
+
+def test_compact_round_trip(provider_module, open_provider, tmp_path):
+    path = str(tmp_path / 'edits.myvec')
+    _write(path, [HEADER] + ROWS)
+    provider = open_provider(path)
+    _edit(provider)
+    edited = _attributes(provider)
+    assert len(edited) == 8
+    assert edited[0][:2] == [42, 'changed']
+
+    # Журнал воспроизводится при повторном открытии
+    provider = _reopen(provider_module, open_provider, path, provider)
+    assert os.path.exists(path + '.mvjournal')
+    assert _attributes(provider) == edited
+
+    assert provider.compactJournal()
+    assert not os.path.exists(path + '.mvjournal')
+    # После сжатия fid идут подряд
+    expected = [edited[fid] for fid in sorted(edited)]
+    assert list(_attributes(provider).values()) == expected
+
+    provider = _reopen(provider_module, open_provider, path, provider)
+    assert list(_attributes(provider).values()) == expected
+    assert provider.featureCount() == 8
+
+
+def test_compact_refuses_lossy_file(provider_module, open_provider, tmp_path, monkeypatch):
+    path = str(tmp_path / 'lossy.myvec')
+    lines = [HEADER] + ROWS + [
+        'COMMENT:не запись данных',
+        'DATA:bad,1.0,11,bad x',
+        'DATA:12.0,12.5,12,extra,лишнее',
+    ]
+    _write(path, lines)
+    provider = open_provider(path)
+    _edit(provider)
+    messages = []
+    monkeypatch.setattr(provider, '_report_error', messages.append)
+
+    assert not provider.compactJournal()
+    # Файл не тронут, правки остаются в журнале
+    with open(path) as f:
+        assert f.read().splitlines() == lines
+    assert os.path.exists(path + '.mvjournal')
+    assert not os.path.exists(path + '.compact')
+    assert len(messages) == 1 and '3 строк' in messages[0]
+
+
+def test_compact_discarded_when_file_changes(provider_module, open_provider, tmp_path):
+    path = str(tmp_path / 'changed.myvec')
+    _write(path, [HEADER] + ROWS)
+    provider = open_provider(path)
+    _edit(provider)
+
+    task = provider_module._CompactTask(provider)
+    assert task.run()
+    # Строка дописана, пока сжатый файл писался
+    with open(path, 'a', newline='\n') as f:
+        f.write('DATA:10.0,10.5,10,row 10\n')
+    task.finished(True)
+
+    assert task.error is not None
+    assert not os.path.exists(path + '.compact')
+    assert os.path.exists(path + '.mvjournal')
+    with open(path) as f:
+        assert f.read().splitlines() == [HEADER] + ROWS + ['DATA:10.0,10.5,10,row 10']
@@ -0,0 +1,36 @@
+"""Упрощенная отрисовка по пирамиде сеток"""
+HEADER = 'HEADER:i:int'
+
+
+def _write(path, count):
+    with open(path, 'w', newline='\n') as f:
+        f.write(HEADER + '\n')
+        f.writelines(f'DATA:{i % 100}.5,{i // 100}.5,{i}\n' for i in range(count))
+
+
+def _pyramid_builds(provider):
+    return provider.profile()['timings'].get('pyramid', {}).get('calls', 0)
+
+
+def test_pyramid_built_on_first_render_request(open_provider, tmp_path):
+    from qgis.core import QgsFeatureRequest, QgsRectangle, QgsSimplifyMethod
+    path = str(tmp_path / 'points.myvec')
+    _write(path, 10000)
+    provider = open_provider(path, 'lod=thin&profile=true')
+    rect = QgsRectangle(0, 0, 100, 100)
+
+    # Источники для запросов без упрощения пирамиду не строят
+    features = list(provider.featureSource().getFeatures(QgsFeatureRequest().setFilterRect(rect)))
+    assert len(features) == 10000
+    assert _pyramid_builds(provider) == 0
+
+    method = QgsSimplifyMethod()
+    method.setMethodType(QgsSimplifyMethod.OptimizeForRendering)
+    method.setTolerance(10.0)
+    request = QgsFeatureRequest().setFilterRect(rect).setSimplifyMethod(method)
+    first = list(provider.featureSource().getFeatures(request))
+    second = list(provider.featureSource().getFeatures(request))
+    assert 0 < len(first) < 10000
+    assert [feature.id() for feature in first] == [feature.id() for feature in second]
+    # Следующие источники получают уже построенную пирамиду
+    assert _pyramid_builds(provider) == 1
@@ -0,0 +1,80 @@
+"""Совпадение построчного, блочного и параллельного разбора"""
+import gc
+import math
+
+import numpy as np
+import pytest
+
+HEADER = 'HEADER:i:int,d:double,s:string,b:bool,t:date'
+ROWS = [
+    'DATA:1.5,2.5,1,0.25,first,true,2024-01-31',
+    'DATA:bad,2.0,2,0.5,bad x,false,2024-02-01',      # некорректная координата
+    'DATA:3.0,,3,0.75,empty y,true,2024-02-02',       # пустая координата
+    'DATA:4.0,5.0',                                   # только координаты
+    'DATA:6.0,7.0,7',                                 # короткая строка
+    'DATA:8.0',                                       # строка короче двух значений
+    'DATA:nan,1.0,9,nan,nan x,yes,',                  # nan в координате и в поле
+    'DATA:inf,-inf,10,inf,inf xy,1,2024-03-03',
+    'COMMENT:не строка данных',
+    '',
+    'DATA:11.0,12.0,oops,notnum,bad types,maybe,2024-04-04',
+    'DATA:13.0,14.0,14,1e3,extra,false,2024-05-05,лишнее',  # лишнее поле
+    'DATA:15.0,16.0,16,-0.0,юникод,true,2024-06-06',
+]
+# Только записи с полным набором значений: у блочного разбора для них
+# отдельный путь
+COMPLETE = [row for row in ROWS if row.startswith('DATA:') and row.count(',') == 6]
+# Последняя строка без перевода строки
+LAST = 'DATA:17.0,18.0,18,1.5,last,false,2024-07-07'
+
+
+def _write(path, rows, newline):
+    with open(path, 'w', newline='') as f:
+        f.write(newline.join([HEADER] + rows * 40 + [LAST]))
+
+
+def _plain(values):
+    """Значения колонки для сравнения: NaN равен NaN"""
+    return ['nan' if isinstance(value, float) and math.isnan(value) else value
+            for value in values.tolist()]
+
+
+def _load(provider_module, open_provider, path, options):
+    """Набор данных и fid объектов файла, разобранного с параметрами options"""
+    from qgis.core import QgsFeatureRequest
+    provider = open_provider(path, options)
+    dataset = provider._dataset
+    fids = [feature.id() for feature in provider.getFeatures(QgsFeatureRequest())]
+    # Следующее открытие должно разобрать файл заново, а не взять его из реестра
+    del provider
+    gc.collect()
+    provider_module._DATASET_REGISTRY.clear()
+    return dataset, fids
+
+
+@pytest.mark.parametrize('rows, loaded', [(ROWS, 8), (COMPLETE, 5)], ids=['mixed', 'complete'])
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_parsers_match(provider_module, open_provider, tmp_path, monkeypatch, newline, rows, loaded):
+    path = str(tmp_path / 'parity.myvec')
+    _write(path, rows, newline)
+    # Несколько диапазонов даже для небольшого файла
+    monkeypatch.setattr(provider_module, '_PARALLEL_MIN_RANGE', 256)
+
+    results = {}
+    for options in ('parser=lines', 'parser=bulk', 'workers=2'):
+        results[options] = _load(provider_module, open_provider, path, options)
+    reference, reference_fids = results['parser=lines']
+    # 40 повторов корректных строк и последняя строка без перевода строки
+    assert len(reference) == 40 * loaded + 1
+    assert reference_fids == list(range(len(reference)))
+
+    for options in ('parser=bulk', 'workers=2'):
+        dataset, fids = results[options]
+        assert dataset is not reference
+        assert fids == reference_fids, options
+        np.testing.assert_array_equal(dataset.x, reference.x)
+        np.testing.assert_array_equal(dataset.y, reference.y)
+        assert len(dataset.columns) == len(reference.columns)
+        for column, expected in zip(dataset.columns, reference.columns):
+            np.testing.assert_array_equal(column.nulls, expected.nulls)
+            assert _plain(column.as_objects()) == _plain(expected.as_objects()), options